@@ -1,2 +1,30 @@
-from .tlpyplot import *
-from .vm_noiseplot import *
\ No newline at end of file
+import importlib
+import tldevicesync
+from .analysis import *
+from .acquisition import syncStream
+from .replay import ReplayStream
+from .device import openDevice
+from .devicecache import DeviceMetadata
+from .metrics import FrameMetrics, StartupTimer, startup
+from .scheduler import FrameScheduler
+from .hub import AcquisitionHub
+from .ramp import SetpointRamp, RampStep, parseProfile
+
+# The plotting modules load matplotlib, so they are only imported on first
+# use; the headless monitor never pulls in a GUI toolkit.
+_plotting = {"TLPyPlot": "tlpyplot", "vmNoise": "vm_noiseplot"}
+
+__all__ = ["powerSpectralDensity", "logBin", "subtractPolynomial", "syncStream",
+           "ReplayStream", "openDevice", "DeviceMetadata", "FrameMetrics",
+           "StartupTimer", "startup", "FrameScheduler", "AcquisitionHub",
+           "SetpointRamp", "RampStep", "parseProfile", "tldevicesync"] + list(_plotting)
+
+def __getattr__(name):
+    if name in ("tlpyplot", "vm_noiseplot"):
+        return importlib.import_module("." + name, __name__)
+    if name in _plotting:
+        return getattr(importlib.import_module("." + _plotting[name], __name__), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_plotting) | {"tlpyplot", "vm_noiseplot"})
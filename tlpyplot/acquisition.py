@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+acquisition: Background reader that keeps draining a Twinleaf I/O data source (anything with a readAvailable() method) into the plot buffers, independently of how fast the GUI redraws.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import threading
+import time
+import tldevicesync
+import numpy as np
+
+def syncStream(streamList):
+    # Sources that already read like a SyncStream (e.g. a ReplayStream) are used as is
+    if hasattr(streamList, 'readAvailable'):
+        return streamList
+    return tldevicesync.SyncStream(streamList)
+
+def toBlock(dataLoad):
+    # readAvailable() gives one list per column, or bare floats for a single sample
+    return np.asarray(dataLoad, dtype=float).reshape(len(dataLoad), -1)
+
+class StreamReader(threading.Thread):
+    def __init__(self, ss, sink, lock, retryDelay=0.1):
+        threading.Thread.__init__(self, daemon = True)
+        self.ss = ss
+        self.sink = sink
+        self.lock = lock
+        self.retryDelay = retryDelay
+        self.samples = 0
+        self.errors = 0
+        self.ingestTime = 0.0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                dataLoad = self.ss.readAvailable()
+            except Exception as e:
+                self.errors += 1
+                print("StreamReader: read failed:", e)
+                time.sleep(self.retryDelay)
+                continue
+            start = time.perf_counter()
+            block = toBlock(dataLoad)
+            with self.lock:
+                if self._stopped.is_set():
+                    break
+                self.sink(block)
+            self.samples += block.shape[1]
+            self.ingestTime += time.perf_counter() - start
+
+    def stop(self, timeout=1):
+        with self.lock:
+            self._stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
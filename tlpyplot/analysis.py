@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+analysis: Noise analysis helpers (detrending, amplitude spectral density and logarithmic binning) shared by the noise plot, the worker processes and the headless monitor. Needs only numpy and scipy, never a GUI toolkit.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+
+def powerSpectralDensity(x, Fs):
+    import scipy.signal # slow to import; only needed once a spectrum is drawn
+    freqs, psd = scipy.signal.periodogram(x, Fs, detrend='linear', scaling='density', window='blackmanharris')
+    psd = np.sqrt(psd)
+    freqs = freqs[1:] # Skip zero Hz element
+    psd = psd[..., 1:]
+    return freqs, psd
+
+def logBin(freqs, psd, N=200, mode=1, verbosity=0):
+    # mode = 0 is for normal average
+    # mode = 1 is for adding in quadrature
+    # Data must be ascending in frequency. psd may be a single spectrum or a
+    # (channels, len(freqs)) batch sharing the same frequencies.
+    xs = np.asarray(freqs, dtype=float)
+    ys = np.asarray(psd, dtype=float)
+    if mode not in (0, 1):
+        raise ValueError("logBin mode must be 0 (mean) or 1 (quadrature)")
+    if xs[0] == 0: # Avoid zero frequency
+        xs = xs[1:]
+        ys = ys[..., 1:]
+    xmax = xs[-1]
+    xmin = xs[0]
+    maxlogx = np.log(xmax)
+    minlogx = np.log(xmin)
+    bins = np.exp(np.arange(N, dtype = float)/(N-1.)*(maxlogx-minlogx)+minlogx)
+    bins[0] = xmin
+    bins[-1] = xmax
+    # Bins are closed above: a point on an edge belongs to the lower bin
+    binindex = np.maximum(np.searchsorted(bins, xs, side='left'), 1)
+    starts = np.flatnonzero(np.r_[True, binindex[1:] != binindex[:-1]])
+    # The bin holding the highest frequencies is left out, as it always has been
+    starts = starts[:-1]
+    if len(starts) == 0:
+        return np.array([]), np.empty(ys.shape[:-1] + (0,))
+    end = starts[-1] + np.count_nonzero(binindex == binindex[starts[-1]])
+    counts = np.diff(np.r_[starts, end])
+    binnedx = np.add.reduceat(xs[:end], starts) / counts
+    if mode == 0:
+        binnedy = np.add.reduceat(ys[..., :end], starts, axis = -1) / counts
+    else:
+        binnedy = np.sqrt(np.add.reduceat(ys[..., :end]**2, starts, axis = -1) / counts)
+    return binnedx, binnedy
+
+def subtractPolynomial(xdata, ydata):
+    p = np.polyfit(xdata, ydata, 3)
+    poly = np.polyval(p,xdata)
+    ydata = ydata - poly
+    return ydata
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+autoscale: Incremental y autoscaling for the live plots. Running extrema of the plot window are kept as per-block minima and maxima updated as samples arrive, so a frame never rescans the window, and the axis limits only move once the data leave them or shrink well inside them.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+from .ringbuffer import RingBuffer
+
+class RunningExtrema:
+    """Minimum and maximum of each channel over the last `length` samples.
+
+    Samples are folded into blocks of `blockSize`; only the block extrema are
+    kept, in a ring sized to the window. The window edge is resolved to whole
+    blocks, so up to two blocks of older samples may still count.
+    """
+    def __init__(self, channels, length, blockSize=256):
+        self.channels = channels
+        self.blockSize = int(blockSize)
+        self.blocks = RingBuffer(2*channels, self._blockCount(length))
+        self._reset()
+
+    def _blockCount(self, length):
+        return -(-int(length) // self.blockSize)
+
+    def _reset(self):
+        self._fill = 0
+        self._lo = np.full(self.channels, np.inf)
+        self._hi = np.full(self.channels, -np.inf)
+
+    def extend(self, y):
+        y = np.asarray(y, dtype = float).reshape(self.channels, -1)
+        take = min(self.blockSize - self._fill, y.shape[1])
+        if take:
+            self._fold(y[:, :take])
+            if self._fill == self.blockSize:
+                self.blocks.extend(np.r_[self._lo, self._hi][:, None])
+                self._reset()
+        rest = y[:, take:]
+        whole = rest.shape[1] // self.blockSize * self.blockSize
+        if whole:
+            groups = rest[:, :whole].reshape(self.channels, -1, self.blockSize)
+            self.blocks.extend(np.concatenate((np.fmin.reduce(groups, axis = 2),
+                                               np.fmax.reduce(groups, axis = 2))))
+        if rest.shape[1] > whole:
+            self._fold(rest[:, whole:])
+
+    def _fold(self, y):
+        # fmin/fmax skip NaN (dropouts) unless every sample is NaN
+        self._lo = np.fmin(self._lo, np.fmin.reduce(y, axis = 1))
+        self._hi = np.fmax(self._hi, np.fmax.reduce(y, axis = 1))
+        self._fill += y.shape[1]
+
+    def extrema(self):
+        blocks = self.blocks.view()
+        lo = np.fmin(self._lo, np.fmin.reduce(blocks[:self.channels], axis = 1, initial = np.inf))
+        hi = np.fmax(self._hi, np.fmax.reduce(blocks[self.channels:], axis = 1, initial = -np.inf))
+        return lo, hi
+
+    def resize(self, length):
+        self.blocks.resize(self._blockCount(length))
+
+    def clear(self):
+        self.blocks.clear()
+        self._reset()
+
+def hysteresisLimits(ymin, ymax, limits, margin=0.2, shrink=0.25):
+    """New (low, high) axis limits, or None to keep `limits`.
+
+    The limits grow as soon as the data leave them and shrink only when the
+    data span less than `shrink` of the view; either way they are reset to
+    the data range padded by `margin` of it.
+    """
+    if not (np.isfinite(ymin) and np.isfinite(ymax)):
+        return None
+    span = max(ymax - ymin, abs(ymax)*1e-6, 1e-12)
+    y0, y1 = limits
+    if ymin < y0 or ymax > y1 or span < shrink*(y1 - y0):
+        pad = span * margin / 2
+        return ymin - pad, ymax + pad
+    return None
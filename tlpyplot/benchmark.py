@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+benchmark: Headless (Agg) benchmarks of the import time and of the ingestion, rendering and noise paths with synthetic data. Sweeps sample rate, channel count and window length and writes one JSON record per configuration, so runs from different versions can be compared.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+
+Usage: python3 -m tlpyplot.benchmark --rates 1000 10000 --channels 3 12 --windows 10 60 -o bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import matplotlib
+import numpy as np
+
+class BenchSource:
+    """Non-paced SyncStream stand-in handing out `chunk` precomputed samples per read."""
+    def __init__(self, rate, channels, chunk, seed=0):
+        rng = np.random.default_rng(seed)
+        self._rate = float(rate)
+        self.chunk = chunk
+        self._block = rng.standard_normal((channels, chunk))
+        self._block += np.sin(2*np.pi*60*np.arange(chunk)/rate)
+        self._names = ["time"] + ["bench ch%d" % i for i in range(channels)]
+        self.position = 0
+
+    def rate(self):
+        return self._rate
+
+    def columnnames(self, timeaxis=True, withName=True):
+        return self._names if timeaxis else self._names[1:]
+
+    def read(self, samples=1, duration=None, timeaxis=True, flush=True):
+        t = (self.position + np.arange(samples))/self._rate
+        self.position += samples
+        reps = -(-samples // self.chunk)
+        data = np.tile(self._block, reps)[:, :samples]
+        return [t] + list(data) if timeaxis else list(data)
+
+    def readAvailable(self, timeaxis=True):
+        return self.read(samples = self.chunk, timeaxis = timeaxis)
+
+def percentiles(times):
+    times = np.asarray(times)*1e3
+    return {"p50_ms": float(np.percentile(times, 50)),
+            "p90_ms": float(np.percentile(times, 90)),
+            "p99_ms": float(np.percentile(times, 99)),
+            "max_ms": float(times.max())}
+
+def timeit(func, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+def benchIngest(rate, channels, window, frameInterval):
+    from .tlpyplot import TLPyPlot
+    from .recorder import StreamRecorder
+    chunk = max(int(rate*frameInterval), 1)
+    frames = max(int(2*window/frameInterval), 10)
+    result = {}
+    # Through the hub as in the viewers: gap detection, then every sink, the
+    # second time with a recorder subscribed as well
+    for key in ("samples_per_s", "samples_per_s_recording"):
+        plotter = TLPyPlot(int(rate*window), BenchSource(rate, channels, chunk))
+        recorder = None
+        if key == "samples_per_s_recording":
+            directory = tempfile.mkdtemp()
+            recorder = StreamRecorder(os.path.join(directory, "bench.tlr"), plotter.ss.columnnames(), plotter.ss.rate())
+            plotter.hub.subscribe(recorder.write)
+        start = time.perf_counter()
+        for i in range(frames):
+            plotter.hub.poll()
+        result[key] = frames*chunk/(time.perf_counter() - start)
+        if recorder is not None:
+            plotter.hub.unsubscribe(recorder.write)
+            result["record_dropped"] = recorder.close()["droppedSamples"]
+            os.remove(recorder.path)
+            os.rmdir(directory)
+        else:
+            resize = timeit(lambda: (plotter.changeQueueSize(2*plotter.queueLength),
+                                     plotter.changeQueueSize(plotter.queueLength//2)), 3)
+        matplotlib.pyplot.close(plotter.fig)
+    result["resize_ms"] = float(np.median(resize))*1e3/2
+    return result
+
+def benchRender(rate, channels, window, frameInterval, frames, blit, strip=False):
+    from .tlpyplot import TLPyPlot
+    chunk = max(int(rate*frameInterval), 1)
+    plotter = TLPyPlot(int(rate*window), BenchSource(rate, channels, chunk), blit = blit, strip = strip)
+    plotter.fig.set_size_inches(12.8, 7.2)
+    # Fill the window before measuring so every frame draws a full buffer
+    while len(plotter.buffer) < plotter.queueLength:
+        plotter.buffer.extend(np.asarray(plotter.ss.readAvailable()))
+    plotter.fig.canvas.draw()
+    def frame():
+        plotter.animate()
+        if not blit:
+            plotter.fig.canvas.draw()
+    times = timeit(frame, frames)
+    matplotlib.pyplot.close(plotter.fig)
+    return percentiles(times)
+
+def benchNoise(rate, channels, window, repeat, refresh=2.0):
+    from .analysis import subtractPolynomial, powerSpectralDensity, logBin
+    from .welch import StreamingWelch
+    rng = np.random.default_rng(1)
+    n = int(rate*window)
+    t = np.arange(n)/rate
+    data = rng.standard_normal((channels, n))
+    def periodogram():
+        detrended = np.array([subtractPolynomial(t, data[i]) for i in range(channels)])
+        freqs, psd = powerSpectralDensity(detrended, rate)
+        logBin(freqs, psd, N=500)
+    freqs, psd = powerSpectralDensity(data, rate)
+    welch = StreamingWelch(rate, channels, int(rate))
+    new = data[:, :int(rate*refresh)]
+    def welchRefresh():
+        welch.update(new)
+        logBin(*welch.spectrum(), N=500)
+    return {"periodogram": percentiles(timeit(periodogram, repeat)),
+            "logbin": percentiles(timeit(lambda: logBin(freqs, psd, N=500), repeat)),
+            "welch_refresh": percentiles(timeit(welchRefresh, repeat))}
+
+def benchStartup(repeat):
+    # Cold imports in fresh interpreters; each module is timed on its own
+    script = "import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)"
+    result = {}
+    for module in ("tlpyplot", "tlpyplot.tlpyplot", "tlpyplot.vm_noiseplot"):
+        times = [float(subprocess.run([sys.executable, "-c", script % module], capture_output = True,
+                                      text = True, check = True, env = {**os.environ, "MPLBACKEND": "Agg"}).stdout)
+                 for i in range(repeat)]
+        result[module] = percentiles(times)
+    return result
+
+def run(rates, channelCounts, windows, frames=30, repeat=5, frameInterval=0.1, log=sys.stderr):
+    results = []
+    for rate in rates:
+        for channels in channelCounts:
+            for window in windows:
+                config = {"rate": rate, "channels": channels, "window_s": window}
+                print("benchmark", config, file = log)
+                record = dict(config)
+                record["ingest"] = benchIngest(rate, channels, window, frameInterval)
+                record["render"] = benchRender(rate, channels, window, frameInterval, frames, False)
+                record["render_blit"] = benchRender(rate, channels, window, frameInterval, frames, True)
+                record["render_strip"] = benchRender(rate, channels, window, frameInterval, frames, False, strip = True)
+                record["render_strip_blit"] = benchRender(rate, channels, window, frameInterval, frames, True, strip = True)
+                record["noise"] = benchNoise(rate, channels, window, repeat)
+                results.append(record)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(prog='tlpyplot.benchmark',
+                             description='Headless ingestion, rendering and noise benchmarks')
+    parser.add_argument("--rates", type=float, nargs='+', default=[1000, 10000])
+    parser.add_argument("--channels", type=int, nargs='+', default=[3, 12])
+    parser.add_argument("--windows", type=float, nargs='+', default=[10, 60],
+                help='Window lengths in seconds')
+    parser.add_argument("--frames", type=int, default=30,
+                help='Frames timed per render configuration')
+    parser.add_argument("--repeat", type=int, default=5,
+                help='Repetitions per noise computation')
+    parser.add_argument("-o", "--output",
+                help='Write JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    matplotlib.use("Agg")
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "platform": platform.platform(),
+        "startup": benchStartup(args.repeat),
+        "results": run(args.rates, args.channels, args.windows, args.frames, args.repeat),
+        }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 2)
+    else:
+        json.dump(report, sys.stdout, indent = 2)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+decimate: Reduce long sample windows to about two points per pixel column before they are handed to matplotlib, keeping the extremes of every column so narrow spikes stay visible.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+
+def minMaxDecimate(x, y, bins):
+    """Min/max decimation of y (channels x samples) sampled at x.
+
+    The samples are split into `bins` equal groups and each group is replaced
+    by its minimum and maximum, in the order they occurred. Returns x and y
+    arrays of shape (channels, 2*bins); x differs per channel because the
+    extremes fall on different samples. Short inputs are returned unchanged.
+    """
+    y = np.atleast_2d(y)
+    n = y.shape[1]
+    bins = int(bins)
+    if bins < 1 or n <= 2*bins:
+        return np.broadcast_to(x, y.shape), y
+    per = -(-n // bins)
+    nb = -(-n // per)
+    pad = nb*per - n
+    if pad:
+        y = np.concatenate((y, np.repeat(y[:, -1:], pad, axis = 1)), axis = 1)
+    groups = y.reshape(y.shape[0], nb, per)
+    imin = groups.argmin(axis = 2)
+    imax = groups.argmax(axis = 2)
+    base = np.arange(nb) * per
+    idx = np.empty((y.shape[0], 2*nb), dtype = np.intp)
+    idx[:, 0::2] = np.minimum(imin, imax) + base
+    idx[:, 1::2] = np.maximum(imin, imax) + base
+    np.minimum(idx, n - 1, out = idx)
+    return np.asarray(x)[idx], np.take_along_axis(y, idx, axis = 1)
+
+def pixelColumns(ax):
+    return max(int(ax.bbox.width), 1)
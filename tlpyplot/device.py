@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+device: Open a Twinleaf I/O connection by URL. Besides the usual tldevicesync URLs (tcp://, udp://, serial ports), sim:// URLs give a simulated device for running the viewers without hardware.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import sys
+import time
+import tldevicesync
+from .simulate import SimDeviceSync
+
+def _routeReady(tio, device):
+    # Routes behind a sync hub are specialized on their own thread, which
+    # afterwards extends the short name by the route and only then publishes
+    # the device as an attribute of tio (e.g. tio.vmr0); until then a stream
+    # list naming it cannot be resolved
+    return any(value is device for value in list(vars(tio).values()))
+
+def waitReady(tio, timeout=5.0, poll=0.02, settle=0.2, expect=None):
+    """Wait until every route of `tio` has been specialized.
+
+    Devices behind a sync hub show up as they announce themselves, so the
+    route set also has to stay unchanged for `settle` seconds, unless the
+    routes to `expect` (e.g. from the metadata cache) are known. Returns the
+    seconds waited; after `timeout` a warning is printed and the viewer
+    carries on with whatever has appeared.
+    """
+    start = time.perf_counter()
+    stable = None
+    routes = None
+    while True:
+        now = time.perf_counter()
+        current = set(tio._routes)
+        if current != routes:
+            routes = current
+            stable = now
+        ready = all(_routeReady(tio, tio._routes[key]) for key in current)
+        if ready and (now - stable >= settle or (expect is not None and current >= set(expect))):
+            return now - start
+        if now - start > timeout:
+            waiting = [key for key in current if not _routeReady(tio, tio._routes[key])]
+            print("Warning: device not ready after %g s%s" % (timeout, ", waiting for " + ", ".join(waiting) if waiting else ""),
+                  file = sys.stderr)
+            return now - start
+        time.sleep(poll)
+
+def openDevice(url, timeout=5.0, expect=None):
+    if url.startswith("sim://"):
+        return SimDeviceSync(url)
+    # DeviceSync sleeps a fixed second by default; polling returns as soon as
+    # the device has described itself
+    tio = tldevicesync.DeviceSync(url, connectionTime = 0)
+    waitReady(tio, timeout = timeout, expect = expect)
+    return tio
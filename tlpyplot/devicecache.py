@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+devicecache: On-disk cache of what is connected behind a URL (routes, device names, serial numbers and firmware, streams with their columns and rates). Enumerating a SYNC unit takes an RPC round trip per device, so the viewers build their stream lists from the cache and check it against the live device in the background.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Next to the RPC cache kept by tio
+defaultPath = os.path.join(tempfile.gettempdir(), 'com.twinleaf.tlpyplot.cache', 'devices.json')
+
+def _identity(device):
+    # The description string fetched while the route was specialized, so
+    # reading it costs no RPC. None when the session does not keep it
+    return getattr(device._tio, 'desc', None)
+
+def describeDevice(tio):
+    """Description of every route of `tio`, read from the live device."""
+    routes = {}
+    for key, device in list(tio._routes.items()):
+        streams = {}
+        for info in device._tio.protocol.streams:
+            stream = device
+            for part in info['source_name'].split("."):
+                stream = getattr(stream, part)
+            streams[info['source_name']] = {"columns": list(stream.columnnames(withName = False)),
+                                            "rate": float(stream.rate())}
+        routes[key] = {"name": device.dev.name(),
+                       "identity": _identity(device),
+                       "serial": device.dev.firmware.serial(),
+                       "firmware": device.dev.firmware.hash(),
+                       "streams": streams}
+    return {"saved": time.time(), "routes": routes}
+
+def streamLabel(name, route, stream):
+    # The attribute path tioview accepts, e.g. vmr.vector or vmr0.vector
+    name = name.lower().replace(" ", "_")
+    return name + ("" if route == "/" else route) + "." + stream
+
+def loadMetadata(url, path=defaultPath):
+    try:
+        with open(path) as f:
+            return json.load(f).get(url)
+    except (OSError, ValueError):
+        return None
+
+def storeMetadata(url, description, path=defaultPath):
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    entries[url] = description
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    # Write then rename so that a viewer starting meanwhile never reads half a file
+    temporary = path + ".%d" % os.getpid()
+    with open(temporary, 'w') as f:
+        json.dump(entries, f, indent = 1)
+    os.replace(temporary, path)
+
+def matchesDevice(tio, description):
+    """Cheap check that `description` still fits `tio`: the same routes with
+    the same device identities, without any RPC."""
+    routes = description["routes"]
+    if set(routes) != set(tio._routes):
+        return False
+    return all(routes[key]["identity"] == _identity(tio._routes[key]) for key in routes)
+
+def _comparable(description):
+    # Rates are settings rather than identity; a changed rate is not a new setup
+    return {key: dict(route, streams = {name: stream["columns"] for name, stream in route["streams"].items()})
+            for key, route in description["routes"].items()}
+
+class DeviceMetadata:
+    """Metadata of the device at `url`, cached across runs.
+
+    Create it before connecting so that openDevice() can stop waiting once
+    the expected routes are up, then attach() the connection. A cached
+    description that still matches is used right away and revalidated on a
+    background thread; `changed` is set when the device turned out to
+    differ and `description` has been replaced.
+    """
+    def __init__(self, url, path=defaultPath, useCache=True):
+        self.url = url
+        self.path = path
+        self.description = loadMetadata(url, path) if useCache else None
+        self.cached = self.description is not None
+        self.changed = threading.Event()
+        self.checked = threading.Event()
+        self.error = None
+
+    def expectedRoutes(self):
+        if self.description is None:
+            return None
+        return list(self.description["routes"])
+
+    def attach(self, tio):
+        self.tio = tio
+        if self.description is not None and matchesDevice(tio, self.description):
+            threading.Thread(target = self._revalidate, daemon = True).start()
+        else:
+            self.cached = False
+            self.description = describeDevice(tio)
+            storeMetadata(self.url, self.description, self.path)
+            self.checked.set()
+        return self
+
+    def _revalidate(self):
+        try:
+            live = describeDevice(self.tio)
+            storeMetadata(self.url, live, self.path)
+            if _comparable(live) != _comparable(self.description):
+                self.description = live
+                self.changed.set()
+        except Exception as e: # keep using the cached description
+            self.error = e
+        finally:
+            self.checked.set()
+
+    def routes(self):
+        return list(self.description["routes"])
+
+    def name(self, route):
+        return self.description["routes"][route]["name"]
+
+    def streams(self, route):
+        return list(self.description["routes"][route]["streams"])
+
+    def labels(self, route):
+        return [streamLabel(self.name(route), route, stream) for stream in self.streams(route)]
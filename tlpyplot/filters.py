@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+filters: Real-time filtering and decimation between a Twinleaf I/O data source and its consumers. IIR sections and polyphase FIR decimators keep their state from one chunk to the next, so every sample is filtered exactly once, all channels in one vectorized call, and the plots, noise spectra and recordings downstream see the filtered, reduced-rate stream.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+
+Filter specs are comma separated stages applied in order, e.g.
+'notch:60,lowpass:100,decimate:10':
+    lowpass:F[:ORDER]     Butterworth low pass at F Hz (order 4)
+    highpass:F[:ORDER]    Butterworth high pass at F Hz (order 4)
+    notch:F[:Q]           IIR notch at F Hz (Q 30)
+    decimate:M            anti-aliasing FIR low pass keeping every Mth sample
+"""
+
+import numpy as np
+from .acquisition import toBlock
+
+class SOSFilter:
+    """IIR filter in second order sections carrying its state across chunks."""
+    factor = 1
+    delay = 0.0
+
+    def __init__(self, sos):
+        self.sos = np.asarray(sos, dtype = float)
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def __call__(self, y):
+        import scipy.signal
+        if self.zi is None:
+            # Start in the steady state for the first sample to avoid a step
+            self.zi = scipy.signal.sosfilt_zi(self.sos)[:, None, :] * y[None, :, :1]
+        y, self.zi = scipy.signal.sosfilt(self.sos, y, axis = -1, zi = self.zi)
+        if not np.all(np.isfinite(self.zi)):
+            # A dropout (NaN) would otherwise poison the state for good
+            self.zi = None
+        return y
+
+class FIRDecimator:
+    """Linear phase FIR low pass followed by keeping every `factor`th sample.
+
+    Only the kept outputs are computed, with scipy's polyphase upfirdn. The
+    last taps-1 inputs and the phase of the next output are carried over,
+    so chunk boundaries are seamless. The filter has 2*`width`*factor + 1
+    taps and delays the signal by width*factor input samples.
+    """
+    def __init__(self, factor, width=10, cutoff=0.8):
+        import scipy.signal
+        self.factor = int(factor)
+        self.taps = scipy.signal.firwin(2*width*self.factor + 1, cutoff/self.factor)
+        self.reach = 2*width
+        self.delay = width*self.factor
+        self.reset()
+
+    def reset(self):
+        self._history = None
+        self._phase = 0
+
+    def __call__(self, y):
+        import scipy.signal
+        M = self.factor
+        if self._history is None:
+            self._history = np.repeat(y[:, :1], len(self.taps) - 1, axis = 1)
+        x = np.concatenate((self._history, y), axis = 1)
+        n = y.shape[1]
+        count = max(-(-(n - self._phase) // M), 0)
+        # upfirdn output j sits at input j*M; the first `reach` outputs are
+        # the ones still overlapping the history
+        out = scipy.signal.upfirdn(self.taps, x[:, self._phase:], down = M, axis = -1)[:, self.reach:self.reach + count]
+        self._phase += count*M - n
+        self._history = x[:, x.shape[1] - (len(self.taps) - 1):]
+        if not np.all(np.isfinite(self._history)):
+            self._history = None
+        return out
+
+def parseFilters(spec, Fs):
+    """Stages for the filter spec `spec` at sample rate `Fs`.
+
+    Consecutive IIR stages are merged into one set of sections; each
+    decimation divides the rate seen by the stages after it.
+    """
+    import scipy.signal
+    stages = []
+    sections = []
+    for item in spec.split(","):
+        fields = [field.strip() for field in item.split(":")]
+        kind = fields[0].lower()
+        if not kind:
+            continue
+        if kind in ("lowpass", "highpass"):
+            order = int(fields[2]) if len(fields) > 2 else 4
+            sections.append(scipy.signal.butter(order, float(fields[1]), btype = kind, fs = Fs, output = 'sos'))
+        elif kind == "notch":
+            Q = float(fields[2]) if len(fields) > 2 else 30.0
+            b, a = scipy.signal.iirnotch(float(fields[1]), Q, fs = Fs)
+            sections.append(scipy.signal.tf2sos(b, a))
+        elif kind == "decimate":
+            if sections:
+                stages.append(SOSFilter(np.concatenate(sections)))
+                sections = []
+            stages.append(FIRDecimator(int(fields[1])))
+            Fs = Fs/stages[-1].factor
+        else:
+            raise ValueError("Unknown filter: " + item)
+    if sections:
+        stages.append(SOSFilter(np.concatenate(sections)))
+    return stages
+
+class FilterChain:
+    def __init__(self, stages, Fs):
+        self.stages = stages
+        self.inputRate = float(Fs)
+        self.factor = int(np.prod([stage.factor for stage in stages]))
+        # Group delay of the decimators in seconds, taken off the timestamps
+        # so filtered samples line up with the raw ones
+        self.delay = 0.0
+        rate = self.inputRate
+        for stage in stages:
+            self.delay += stage.delay/rate
+            rate /= stage.factor
+        self._timePhase = 0
+
+    @property
+    def rate(self):
+        return self.inputRate/self.factor
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+        self._timePhase = 0
+
+    def __call__(self, block):
+        # block holds the time column first, then the data channels
+        y = block[1:]
+        for stage in self.stages:
+            y = stage(y)
+        t = block[0, self._timePhase::self.factor][:y.shape[1]] - self.delay
+        self._timePhase = (self._timePhase - block.shape[1]) % self.factor
+        return np.concatenate((t[None, :], y))
+
+class FilteredStream:
+    """Reads like a SyncStream, with the data channels of `ss` filtered.
+
+    The filters are rebuilt whenever the rate of `ss` changes, so after the
+    device rate is changed the chain follows. Other attributes are those of
+    `ss`.
+    """
+    def __init__(self, ss, spec):
+        self.ss = ss
+        self.spec = spec
+        self.chain = None
+
+    def __getattr__(self, name):
+        return getattr(self.ss, name)
+
+    def _chain(self):
+        Fs = float(self.ss.rate())
+        if self.chain is None or self.chain.inputRate != Fs:
+            self.chain = FilterChain(parseFilters(self.spec, Fs), Fs)
+        return self.chain
+
+    def rate(self):
+        return self._chain().rate
+
+    def readAvailable(self):
+        block = toBlock(self.ss.readAvailable())
+        if block.shape[1] == 0:
+            return block
+        return self._chain()(block)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+gaps: Dropout detection on the time column of incoming data. Each chunk is checked in one vectorized pass against the expected sample spacing; the hub counts lost samples and marks where data are missing, plots stop their lines there and the noise estimates never let a segment span a gap.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+
+def findGaps(t, rate, last=None):
+    """Positions in `t` that follow missing samples, counting from `last`,
+    the timestamp before t[0], if given.
+
+    Returns the positions and the samples missing before each; a timestamp
+    that does not advance (a device reset) counts as a gap of -1 samples.
+    """
+    t = np.asarray(t, dtype = float)
+    if last is not None:
+        t = np.r_[last, t]
+    if len(t) < 2:
+        return np.empty(0, dtype = np.intp), np.empty(0, dtype = int)
+    steps = np.diff(t)*rate
+    index = np.flatnonzero((steps > 1.5) | (steps <= 0))
+    missing = np.where(steps[index] > 0, np.rint(steps[index]) - 1, -1).astype(int)
+    return index + (0 if last is not None else 1), missing
+
+class GapDetector:
+    """Running gap count over consecutive chunks of one stream."""
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.last = None
+        self.gaps = 0
+        self.missing = 0
+        self.resets = 0
+
+    def check(self, t):
+        # Positions in t where data are missing before the sample
+        breaks, missing = findGaps(t, self.rate, self.last)
+        if len(t):
+            self.last = t[-1]
+        self.gaps += len(breaks)
+        self.missing += int(missing[missing > 0].sum())
+        self.resets += int(np.count_nonzero(missing < 0))
+        return breaks
+
+def insertBreaks(block, breaks, rate):
+    """`block` with a NaN sample before each break so plotted lines stop at
+    gaps. The NaN sample is timed one period before the sample it precedes."""
+    if len(breaks) == 0:
+        return block
+    fill = np.full((block.shape[0], len(breaks)), np.nan)
+    fill[0] = block[0, breaks] - 1.0/rate
+    return np.insert(block, breaks, fill, axis = 1)
+
+def contiguousTail(data):
+    """Start of the last run of samples without NaN in any channel."""
+    bad = np.flatnonzero(np.isnan(data).any(axis = 0))
+    return bad[-1] + 1 if len(bad) else 0
+
+def updateAcross(estimator, block, breaks):
+    """Feed `block` to a streaming estimator (StreamingWelch,
+    StreamingSpectrogram) so that no segment spans one of the breaks."""
+    segments = 0
+    for i, piece in enumerate(np.split(block, breaks, axis = -1)):
+        if i:
+            estimator.dropPending()
+        segments += estimator.update(piece)
+    return segments
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+headless: Data path of the viewers without any plotting. Drains a Twinleaf I/O data source on a reader thread and, every interval, reports per-channel statistics, band-averaged noise from a streaming Welch estimate and dropouts as one summary record. Imports neither matplotlib nor tkinter.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import time
+import numpy as np
+from .hub import AcquisitionHub
+from .analysis import logBin
+from .recorder import StreamRecorder
+from .gaps import updateAcross
+from .welch import StreamingWelch
+
+class HeadlessMonitor:
+    def __init__(self, streamList, interval=10.0, welchSegment=1.0, forget=None, band=(1.0, 10.0), bins=0, filters=None):
+        # Without forget the noise estimate restarts every interval; with it
+        # the Welch average carries over with that weight per segment.
+        # bins > 0 adds a log binned spectrum to every summary
+        self._ownHub = not isinstance(streamList, AcquisitionHub)
+        self.hub = AcquisitionHub(streamList, filters = filters) if self._ownHub else streamList
+        self.lock = self.hub.lock
+        self.ss = self.hub.ss
+        self.names = self.ss.columnnames()
+        self.interval = interval
+        self.welchSegment = welchSegment
+        self.forget = forget
+        self.band = band
+        self.bins = bins
+        self.reader = None
+        self.recorder = None
+        self.welch = None
+        self.samples = 0
+        self.gaps = 0
+        self.missing = 0
+        self._pending = []
+        self._breaks = []
+        self._pendingSamples = 0
+        self._gapsSeen = (self.hub.gaps.gaps, self.hub.gaps.missing)
+        self._lastSummary = None
+
+    def ingest(self, block):
+        # Called by the hub's reader thread with self.lock held
+        self._breaks.extend(self._pendingSamples + self.hub.breaks)
+        self._pending.append(block)
+        self._pendingSamples += block.shape[1]
+
+    def start(self):
+        if self.reader is None:
+            self._lastSummary = time.time()
+            self.hub.subscribe(self.ingest)
+            self.reader = self.hub.start()
+
+    def stop(self):
+        if self.reader is not None:
+            self.hub.unsubscribe(self.ingest)
+            if self._ownHub:
+                self.hub.stop()
+            self.reader = None
+        self.stopRecording()
+
+    def startRecording(self, path):
+        self.recorder = StreamRecorder(path, self.ss.columnnames(), self.ss.rate())
+        self.hub.subscribe(self.recorder.write)
+
+    def stopRecording(self):
+        recorder = self.recorder
+        self.recorder = None
+        if recorder is None:
+            return None
+        self.hub.unsubscribe(recorder.write)
+        return recorder.close()
+
+    def summary(self):
+        with self.lock:
+            pending = self._pending
+            breaks = np.array(self._breaks, dtype = np.intp)
+            self._pending = []
+            self._breaks = []
+            self._pendingSamples = 0
+            gapsSeen = (self.hub.gaps.gaps, self.hub.gaps.missing)
+        now = time.time()
+        rate = float(self.ss.rate())
+        channels = len(self.names) - 1
+        if pending:
+            block = np.concatenate(pending, axis = 1)
+        else:
+            block = np.empty((channels + 1, 0))
+        gaps, missing = gapsSeen[0] - self._gapsSeen[0], gapsSeen[1] - self._gapsSeen[1]
+        self._gapsSeen = gapsSeen
+        self.samples += block.shape[1]
+        self.gaps += gaps
+        self.missing += missing
+
+        record = {"time": now, "seconds": now - self._lastSummary, "rate": rate,
+                  "samples": block.shape[1], "gaps": gaps, "missing": missing,
+                  "totalSamples": self.samples, "totalGaps": self.gaps, "totalMissing": self.missing}
+        if self.reader is not None:
+            record["readErrors"] = self.reader.errors
+        if self.recorder is not None:
+            record["recordDropped"] = self.recorder.droppedSamples
+        self._lastSummary = now
+
+        noise, spectrum = self._noise(block[1:], rate, breaks)
+        record["channels"] = {}
+        for i, name in enumerate(self.names[1:]):
+            stats = {}
+            if block.shape[1]:
+                y = block[i+1]
+                stats = {"mean": float(np.mean(y)), "std": float(np.std(y)),
+                         "min": float(np.min(y)), "max": float(np.max(y))}
+            if noise is not None:
+                stats["noise"] = float(noise[i])
+            record["channels"][name] = stats
+        if spectrum is not None:
+            record["spectrum"] = {"freqs": spectrum[0].tolist(), "asd": spectrum[1].tolist()}
+        return record
+
+    def _noise(self, data, rate, breaks):
+        if self.welch is None or self.welch.Fs != rate:
+            self.welch = StreamingWelch(rate, data.shape[0], max(int(self.welchSegment*rate), 8), forget = self.forget)
+        elif self.forget is None:
+            self.welch.reset(keepPending = True)
+        updateAcross(self.welch, data, breaks)
+        if self.welch.segments == 0:
+            return None, None
+        freqs, asd = self.welch.spectrum()
+        inBand = (freqs >= self.band[0]) & (freqs <= self.band[1])
+        if not np.any(inBand): # band above Nyquist or below the resolution
+            inBand = freqs > 0
+        noise = np.sqrt(np.mean(asd[:, inBand]**2, axis = -1))
+        spectrum = logBin(freqs, asd, N = self.bins) if self.bins > 0 else None
+        return noise, spectrum
+
+    def run(self, emit, duration=None):
+        # Calls emit(record) every interval until duration elapses, a replayed
+        # capture runs out or Ctrl-C
+        self.start()
+        stopAt = None if duration is None else time.time() + duration
+        nextSummary = time.time() + self.interval
+        try:
+            while stopAt is None or time.time() < stopAt:
+                if getattr(self.ss, 'finished', False):
+                    break
+                time.sleep(max(min(nextSummary, stopAt or nextSummary, time.time() + 0.5) - time.time(), 0))
+                if time.time() >= nextSummary:
+                    emit(self.summary())
+                    nextSummary += self.interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        if self._pending:
+            emit(self.summary())
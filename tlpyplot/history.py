@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+history: Multi-resolution sample history for windows far longer than the raw buffer. A full-rate recent tier is backed by min/mean/max tiers that are each `factor` times coarser, so hours of data fit in bounded memory and a zoomed-out window is drawn from a few thousand buckets instead of millions of samples.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+from .ringbuffer import RingBuffer
+
+class HistoryPyramid:
+    """Raw window of `rawLength` samples plus `levels` decimated tiers.
+
+    Tier k (from 0) holds `tierLength` buckets of factor**(k+1) raw samples. Each bucket
+    row is laid out as time, the channel minima, the channel means and the
+    channel maxima. `channels` counts the time axis, like RingBuffer. Samples
+    that do not yet fill a bucket wait in a carry, so a tier lags the raw data
+    by less than one of its buckets.
+    """
+    def __init__(self, channels, rawLength, levels=4, factor=16, tierLength=None):
+        self.channels = channels
+        self.levels = levels
+        self.factor = int(factor)
+        self.tierLength = max(int(tierLength), 1) if tierLength else max(int(rawLength)//4, 1024)
+        self.raw = RingBuffer(channels, rawLength)
+        rows = 1 + 3*(channels - 1)
+        self.tiers = [RingBuffer(rows, self.tierLength) for level in range(levels)]
+        self._carry = [np.empty((rows, 0)) for level in range(levels)]
+
+    def extend(self, block):
+        block = np.asarray(block, dtype = float).reshape(self.channels, -1)
+        self.raw.extend(block)
+        if self.levels and block.shape[1]:
+            y = block[1:]
+            self._feed(0, np.concatenate((block[:1], y, y, y)))
+
+    def _feed(self, level, rows):
+        if self._carry[level].shape[1]:
+            rows = np.concatenate((self._carry[level], rows), axis = 1)
+        n = rows.shape[1] // self.factor * self.factor
+        self._carry[level] = np.array(rows[:, n:])
+        if n == 0:
+            return
+        c = self.channels - 1
+        groups = rows[:, :n].reshape(rows.shape[0], -1, self.factor)
+        buckets = np.empty((rows.shape[0], groups.shape[1]))
+        buckets[0] = groups[0].mean(axis = -1)
+        buckets[1:1+c] = groups[1:1+c].min(axis = -1)
+        buckets[1+c:1+2*c] = groups[1+c:1+2*c].mean(axis = -1)
+        buckets[1+2*c:] = groups[1+2*c:].max(axis = -1)
+        self.tiers[level].extend(buckets)
+        if level + 1 < self.levels:
+            self._feed(level + 1, buckets)
+
+    def resize(self, rawLength):
+        self.raw.resize(rawLength)
+
+    def clear(self):
+        self.raw.clear()
+        for tier in self.tiers:
+            tier.clear()
+        self._carry = [carry[:, :0] for carry in self._carry]
+
+    def bucketSize(self, level):
+        return self.factor**(level + 1)
+
+    def level(self, samples):
+        # Finest tier whose buckets span `samples` raw samples, or None if
+        # the raw window is long enough
+        if samples <= self.raw.length:
+            return None
+        for level in range(self.levels):
+            if self.tierLength*self.bucketSize(level) >= samples:
+                return level
+        return self.levels - 1 if self.levels else None
+
+    def envelope(self, level, samples):
+        """Min/max envelope of the last `samples` raw samples from one tier.
+
+        Returns the bucket times with every time repeated, the interleaved
+        minima and maxima as a (channels-1, 2*buckets) array, and the number
+        of buckets, or None while the tier is empty.
+        """
+        data = self.tier(level, samples)
+        if data.shape[1] == 0:
+            return None
+        c = self.channels - 1
+        t = np.repeat(data[0], 2)
+        y = np.empty((c, 2*data.shape[1]))
+        y[:, 0::2] = data[1:1+c]
+        y[:, 1::2] = data[1+2*c:]
+        return t, y, data.shape[1]
+
+    def tier(self, level, samples):
+        data = self.tiers[level].view()
+        buckets = -(-int(samples) // self.bucketSize(level))
+        return data[:, max(data.shape[1] - buckets, 0):]
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+hub: One acquisition point per data source. The hub reads its SyncStream once, on one reader thread, and hands every block to all subscribed consumers (time plot, noise plot, recorder, statistics). Consumers that poll instead get a cursor over a shared ring of recent samples and read zero-copy views of what arrived since their last visit.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import collections
+import threading
+import numpy as np
+from .acquisition import StreamReader, toBlock, syncStream
+from .ringbuffer import RingBuffer
+from .filters import FilteredStream
+from .gaps import GapDetector
+
+class Cursor:
+    """Position of one polling consumer in the hub's sample stream."""
+    def __init__(self, hub, position):
+        self.hub = hub
+        self.position = position
+        self.overrun = 0
+        self.breaks = np.empty(0, dtype = np.intp)
+
+    def read(self):
+        # Call with hub.lock held. Returns a view of the samples since the
+        # last read; samples that already left the ring count as overrun.
+        # breaks then holds the positions in it that follow missing samples
+        ring = self.hub.ring
+        new = self.hub.count - self.position
+        breaks = [position for position in self.hub.breakPositions if position >= self.position]
+        if new > len(ring):
+            self.overrun += new - len(ring)
+            new = len(ring)
+            breaks.insert(0, self.hub.count - new)
+        start = self.hub.count - new
+        self.breaks = np.array([position - start for position in breaks if position >= start], dtype = np.intp)
+        self.position = self.hub.count
+        return ring.view()[:, len(ring)-new:]
+
+class AcquisitionHub:
+    def __init__(self, streamList, lock=None, keep=10.0, filters=None):
+        # keep is the time in seconds the cursor ring holds; it is only
+        # allocated once the first cursor is made. filters is a filter spec
+        # (see tlpyplot.filters) applied before anything is dispatched
+        self.ss = syncStream(streamList)
+        if filters:
+            self.ss = FilteredStream(self.ss, filters)
+        self.filters = filters
+        self.streamList = streamList
+        self.lock = lock if lock is not None else threading.Lock()
+        self.keep = keep
+        self.channels = len(self.ss.read(samples = 1))
+        self.reader = None
+        self.sinks = []
+        self.ring = None
+        self.count = 0
+        # Gaps in the time column, checked once for all consumers
+        self.gaps = GapDetector(self.ss.rate())
+        self.breaks = np.empty(0, dtype = np.intp)
+        self.breakPositions = collections.deque(maxlen = 1000)
+
+    def rate(self):
+        return self.ss.rate()
+
+    def columnnames(self, *args, **kwargs):
+        return self.ss.columnnames(*args, **kwargs)
+
+    def subscribe(self, sink):
+        # sink(block) is called with the lock held, on the reader thread when
+        # one runs. Blocks are shared between sinks and must not be modified;
+        # hub.breaks holds the positions in the block that follow a gap
+        with self.lock:
+            if sink not in self.sinks:
+                self.sinks.append(sink)
+
+    def unsubscribe(self, sink):
+        with self.lock:
+            if sink in self.sinks:
+                self.sinks.remove(sink)
+
+    def cursor(self):
+        with self.lock:
+            if self.ring is None:
+                self.ring = RingBuffer(self.channels, max(int(self.keep*float(self.ss.rate())), 1))
+            return Cursor(self, self.count)
+
+    def start(self):
+        if self.reader is None:
+            self.reader = StreamReader(self.ss, self.dispatch, self.lock)
+            self.reader.start()
+        return self.reader
+
+    def stop(self):
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+
+    def poll(self):
+        # Reads on the calling thread, for consumers running without a reader
+        block = toBlock(self.ss.readAvailable())
+        with self.lock:
+            self.dispatch(block)
+
+    def dispatch(self, block):
+        self.breaks = self.gaps.check(block[0])
+        self.breakPositions.extend(self.count + self.breaks)
+        if self.ring is not None:
+            self.ring.extend(block)
+        self.count += block.shape[1]
+        for sink in self.sinks:
+            sink(block)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+metrics: Per-frame performance counters for the live plots (ingest time, draw time, samples per frame, frame rate, late and dropped frames, buffer fill), shown as an optional on-canvas overlay and written as a periodic JSON lines log.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import collections
+import json
+import time
+import numpy as np
+
+class DrawTimer:
+    """Times every full draw of a figure and reports the seconds to each
+    consumer added with add(). Get it with drawTimer(fig), so that fig.draw
+    is wrapped only once however many consumers there are."""
+    def __init__(self, fig):
+        self.consumers = []
+        draw = fig.draw
+        def timedDraw(renderer):
+            start = time.perf_counter()
+            try:
+                draw(renderer)
+            finally:
+                elapsed = time.perf_counter() - start
+                for consumer in self.consumers:
+                    consumer(elapsed)
+        fig.draw = timedDraw
+
+    def add(self, consumer):
+        self.consumers.append(consumer)
+
+def drawTimer(fig):
+    timer = getattr(fig, '_drawTimer', None)
+    if timer is None:
+        timer = fig._drawTimer = DrawTimer(fig)
+    return timer
+
+class FrameMetrics:
+    def __init__(self, name, interval=0.1, history=100, overlay=True, logPath=None, logInterval=5.0, ingestLabel="ingest"):
+        # interval is the nominal frame period used to call frames late/dropped
+        self.name = name
+        self.ingestLabel = ingestLabel
+        self.interval = interval
+        self.overlay = overlay
+        self.logPath = logPath
+        self.logInterval = logInterval
+        self.frames = collections.deque(maxlen = history)
+        self.total = 0
+        self.late = 0
+        self.dropped = 0
+        self.samples = 0
+        self.fill = 0.0
+        self.backlog = None
+        self.extra = {}
+        self.renderTime = 0.0
+        self._lastStart = None
+        self._lastLog = time.perf_counter()
+        self._log = open(logPath, 'a') if logPath else None
+
+    def frame(self, start, ingest, draw, samples):
+        if self._lastStart is not None:
+            gap = start - self._lastStart
+            if gap > 1.5*self.interval:
+                self.late += 1
+                self.dropped += max(int(round(gap/self.interval)) - 1, 0)
+        self._lastStart = start
+        self.frames.append((start, ingest, draw, samples))
+        self.total += 1
+        self.samples += samples
+        if self._log is not None and start - self._lastLog >= self.logInterval:
+            self.writeLog()
+            self._lastLog = start
+
+    def summary(self):
+        summary = {"name": self.name, "frames": self.total, "late": self.late,
+                   "dropped": self.dropped, "samples": self.samples,
+                   "fill": self.fill, "backlog": self.backlog}
+        if len(self.frames) > 1:
+            frames = np.array(self.frames)
+            span = frames[-1, 0] - frames[0, 0]
+            summary.update({
+                "fps": (len(frames) - 1)/span if span > 0 else 0.0,
+                "ingest_ms": 1e3*float(np.mean(frames[:, 1])),
+                "ingest_max_ms": 1e3*float(np.max(frames[:, 1])),
+                "draw_ms": 1e3*float(np.mean(frames[:, 2])),
+                "draw_max_ms": 1e3*float(np.max(frames[:, 2])),
+                "samples_per_frame": float(np.mean(frames[:, 3])),
+                })
+        summary.update(self.extra)
+        return summary
+
+    def text(self):
+        s = self.summary()
+        if "fps" not in s:
+            return self.name
+        lines = ["%s  %.1f fps  late %d  dropped %d" % (self.name, s["fps"], s["late"], s["dropped"]),
+                 "%s %.1f ms (max %.1f)  draw %.1f ms (max %.1f)" % (self.ingestLabel, s["ingest_ms"], s["ingest_max_ms"], s["draw_ms"], s["draw_max_ms"]),
+                 "%.0f samples/frame  buffer %.0f%%" % (s["samples_per_frame"], 100*s["fill"])]
+        if s["backlog"] is not None:
+            lines[-1] += "  backlog %d" % s["backlog"]
+        for key, value in self.extra.items():
+            lines.append("%s %s" % (key, value if not isinstance(value, float) else "%.1f" % value))
+        return "\n".join(lines)
+
+    def timeDraws(self, fig):
+        # Full redraws happen outside the frame callback (draw_idle), so time
+        # them where they run and let the next frame pick them up
+        drawTimer(fig).add(self._addRenderTime)
+
+    def _addRenderTime(self, seconds):
+        self.renderTime += seconds
+
+    def takeRenderTime(self):
+        renderTime = self.renderTime
+        self.renderTime = 0.0
+        return renderTime
+
+    def addOverlay(self, fig):
+        return fig.text(0.995, 0.995, "", ha = 'right', va = 'top', fontsize = 7,
+                        family = 'monospace', color = 'dimgray', zorder = 10)
+
+    def writeLog(self):
+        summary = self.summary()
+        summary["time"] = time.time()
+        self._log.write(json.dumps(summary) + "\n")
+        self._log.flush()
+
+    def close(self):
+        if self._log is not None:
+            self.writeLog()
+            self._log.close()
+            self._log = None
+
+class StartupTimer:
+    """Seconds from `start` (by default when tlpyplot was imported) to each
+    startup milestone of a viewer: imports done, device ready, first frame.
+    """
+    def __init__(self, name="startup", start=None):
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.marks = []
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter() - self.start))
+
+    def markFirstDraw(self, fig, label="first frame", onDone=None):
+        # onDone(timer) runs once, right after the first draw of fig completes
+        def drawn(event):
+            fig.canvas.mpl_disconnect(connection)
+            self.mark(label)
+            if onDone is not None:
+                onDone(self)
+        connection = fig.canvas.mpl_connect('draw_event', drawn)
+
+    def summary(self):
+        summary = {"name": self.name}
+        for label, seconds in self.marks:
+            summary[label.replace(" ", "_") + "_s"] = seconds
+        return summary
+
+    def text(self):
+        return "%s: " % self.name + ", ".join("%s %.2f s" % mark for mark in self.marks)
+
+    def report(self, show=False, logPath=None):
+        if show:
+            print(self.text())
+        if logPath:
+            summary = self.summary()
+            summary["time"] = time.time()
+            with open(logPath, 'a') as log:
+                log.write(json.dumps(summary) + "\n")
+
+# Started on import so that the viewers' own imports are counted
+startup = StartupTimer()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+noiseworker: Persistent worker processes for the noise spectrum computation, so the detrend/periodogram/logBin work runs outside the GUI process and never holds its GIL. Sample windows are passed through shared memory; only the small binned spectra come back through a pipe.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import multiprocessing
+import multiprocessing.shared_memory
+import time
+import weakref
+import numpy as np
+
+# Workers are spawned rather than forked: a fork of the GUI process would copy
+# its Tk state and any lock another thread happened to hold at the time
+_context = multiprocessing.get_context('spawn')
+
+def noiseSpectrum(t, y, Fs, N=500):
+    from .analysis import subtractPolynomial, powerSpectralDensity, logBin
+    y = subtractPolynomial(t, y)
+    freqs, psd = powerSpectralDensity(y, Fs)
+    return logBin(freqs, psd, N=N)
+
+def _serve(conn):
+    shm = None
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        name, capacity, n, Fs, N = request
+        try:
+            if shm is None or shm.name != name:
+                if shm is not None:
+                    shm.close()
+                shm = multiprocessing.shared_memory.SharedMemory(name = name)
+            window = np.ndarray((2, capacity), dtype = float, buffer = shm.buf)
+            result = noiseSpectrum(np.array(window[0, :n]), np.array(window[1, :n]), Fs, N)
+            del window
+        except Exception as e:
+            result = e
+        conn.send(result)
+    if shm is not None:
+        shm.close()
+
+def _release(conn, shm):
+    try:
+        conn.send(None)
+    except (OSError, ValueError):
+        pass
+    if shm is not None:
+        try:
+            shm.close()
+        except BufferError: # still viewed by the owner at interpreter exit
+            pass
+        shm.unlink()
+
+class NoiseWorker:
+    """One worker process computing the binned noise spectrum of one channel.
+
+    At most one request is in flight; submit() refuses new windows while the
+    worker is busy, so stale data is dropped instead of queueing up.
+    """
+    def __init__(self, N=500):
+        self.N = N
+        self.busy = False
+        self.dropped = 0
+        self.completed = 0
+        self.latency = 0.0
+        self._submitted = 0.0
+        self.capacity = 0
+        self.shm = None
+        self.conn, child = _context.Pipe()
+        self.process = _context.Process(target = _serve, args = (child,), daemon = True)
+        self.process.start()
+        child.close()
+        self._finalizer = weakref.finalize(self, _release, self.conn, None)
+
+    def _allocate(self, n):
+        self._finalizer.detach()
+        self._window = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+        self.capacity = max(n, 2*self.capacity)
+        self.shm = multiprocessing.shared_memory.SharedMemory(create = True, size = 2*self.capacity*8)
+        self._window = np.ndarray((2, self.capacity), dtype = float, buffer = self.shm.buf)
+        self._finalizer = weakref.finalize(self, _release, self.conn, self.shm)
+
+    def submit(self, t, y, Fs):
+        if self.busy:
+            self.dropped += 1
+            return False
+        n = len(y)
+        if n > self.capacity:
+            self._allocate(n)
+        self._window[0, :n] = t
+        self._window[1, :n] = y
+        self.conn.send((self.shm.name, self.capacity, n, Fs, self.N))
+        self._submitted = time.perf_counter()
+        self.busy = True
+        return True
+
+    def poll(self):
+        if not self.busy or not self.conn.poll():
+            return None
+        result = self.conn.recv()
+        self.latency = time.perf_counter() - self._submitted
+        self.busy = False
+        if isinstance(result, Exception):
+            print("NoiseWorker: computation failed:", result)
+            return None
+        self.completed += 1
+        return result
+
+    def close(self):
+        self._window = None
+        self._finalizer()
+        self.process.join(1)
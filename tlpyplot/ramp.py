@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+ramp: Background setpoint controller for heaters such as the cell bakeout therm. Walks a profile of targets, ramping the PID setpoint at a given rate, waiting for the temperature to settle and holding, while the GUI keeps running. Progress is published as plain attributes for the UI to poll.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import threading
+import time
+
+class RampStep:
+    def __init__(self, target, rate=None, hold=0.0):
+        # rate in degrees per minute (None jumps straight to the target),
+        # hold in seconds once the temperature has settled
+        self.target = float(target)
+        self.rate = rate
+        self.hold = hold
+
+def parseProfile(text):
+    """Profile from 'TARGET[:RATE[:HOLD]], ...', e.g. '80:2:600, 120'."""
+    steps = []
+    for item in text.split(","):
+        fields = [field.strip() for field in item.split(":")]
+        if not fields[0]:
+            continue
+        rate = float(fields[1]) if len(fields) > 1 and fields[1] else None
+        hold = float(fields[2]) if len(fields) > 2 and fields[2] else 0.0
+        steps.append(RampStep(float(fields[0]), rate, hold))
+    if not steps:
+        raise ValueError("Empty setpoint profile")
+    return steps
+
+class SetpointRamp(threading.Thread):
+    """Runs a setpoint profile on its own thread.
+
+    read() returns the current temperature, or None while none is known,
+    and setpoint(value=None) reads or
+    writes the PID setpoint, like therm.pid.setpoint. A step is settled when
+    the temperature is within `tolerance` of its target; a step that takes
+    longer than `timeout` seconds stops the profile.
+    """
+    def __init__(self, read, setpoint, profile, tolerance=3.0, timeout=None, poll=5.0):
+        threading.Thread.__init__(self, daemon = True)
+        self.read = read
+        self.setpoint = setpoint
+        self.profile = profile
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.poll = poll
+        self.state = "waiting"
+        self.step = 0
+        self.temperature = None
+        self.current = None
+        self.message = ""
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def finished(self):
+        return self.state in ("done", "timeout", "cancelled", "error")
+
+    def status(self):
+        if self.state == "error":
+            return "Ramp failed: " + self.message
+        if self.state in ("done", "cancelled", "timeout", "waiting"):
+            return "Ramp " + self.state + (": " + self.message if self.message else "")
+        target = self.profile[self.step].target
+        text = "Step %d/%d %s to %g C" % (self.step + 1, len(self.profile), self.state, target)
+        if self.current is not None:
+            text += ", setpoint %.1f" % self.current
+        if self.temperature is not None:
+            text += ", at %.1f" % self.temperature
+        return text
+
+    def run(self):
+        try:
+            for self.step, step in enumerate(self.profile):
+                started = time.time()
+                if not (self._ramp(step) and self._settle(step, started) and self._hold(step)):
+                    return
+            self.state = "done"
+        except Exception as e:
+            self.message = str(e)
+            self.state = "error"
+
+    def _wait(self):
+        # False once cancelled
+        if self._cancelled.wait(self.poll):
+            self.state = "cancelled"
+            return False
+        return True
+
+    def _ramp(self, step):
+        self.state = "ramping"
+        if not step.rate:
+            self.current = step.target
+            self.setpoint(step.target)
+            return True
+        start = float(self.setpoint())
+        direction = 1 if step.target >= start else -1
+        t0 = time.time()
+        while True:
+            value = start + direction*step.rate*(time.time() - t0)/60.0
+            if (value - step.target)*direction >= 0:
+                value = step.target
+            self.current = value
+            self.setpoint(value)
+            self.temperature = self.read()
+            if value == step.target:
+                return True
+            if not self._wait():
+                return False
+
+    def _settle(self, step, started):
+        self.state = "settling"
+        while True:
+            self.temperature = self.read()
+            if self.temperature is not None and abs(self.temperature - step.target) < self.tolerance:
+                return True
+            if self.timeout is not None and time.time() - started > self.timeout:
+                self.message = "%g C not reached within %g s" % (step.target, self.timeout)
+                self.state = "timeout"
+                return False
+            if not self._wait():
+                return False
+
+    def _hold(self, step):
+        self.state = "holding"
+        end = time.time() + step.hold
+        while time.time() < end:
+            self.temperature = self.read()
+            if not self._wait():
+                return False
+        return True
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+recorder: Continuous binary recording of a Twinleaf I/O data source to disk. Files start with a JSON header (column names, rate) padded to HEADER_SIZE bytes, followed by little-endian float64 rows of time and every channel, so they can be appended indefinitely and memory-mapped for replay.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import json
+import queue
+import threading
+import time
+import numpy as np
+
+MAGIC = b"TLREC1\n"
+HEADER_SIZE = 4096
+DTYPE = np.dtype('<f8')
+
+def writeHeader(f, columnnames, rate):
+    header = json.dumps({
+        "columns": list(columnnames),
+        "rate": float(rate),
+        "dtype": DTYPE.str,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }).encode() + b"\n"
+    if len(MAGIC) + len(header) > HEADER_SIZE:
+        raise ValueError("Recording header too long")
+    f.write(MAGIC + header + b" "*(HEADER_SIZE - len(MAGIC) - len(header)))
+
+def readHeader(path):
+    with open(path, 'rb') as f:
+        raw = f.read(HEADER_SIZE)
+    if not raw.startswith(MAGIC):
+        raise ValueError("Not a Twinleaf recording: " + str(path))
+    return json.loads(raw[len(MAGIC):].decode())
+
+class StreamRecorder(threading.Thread):
+    """Appends every block passed to write() to a recording file.
+
+    write() only queues the block, so it can be called from the acquisition
+    thread. A writer thread drains the bounded queue to disk. Blocks that
+    arrive while the queue is full are counted as dropped, not waited on.
+    """
+    def __init__(self, path, columnnames, rate, maxBlocks=1024, flushInterval=1.0):
+        threading.Thread.__init__(self, daemon = True)
+        self.path = path
+        self.columnnames = list(columnnames)
+        self.rate = float(rate)
+        self.columns = len(columnnames)
+        self.flushInterval = flushInterval
+        self.queue = queue.Queue(maxsize = maxBlocks)
+        self.samples = 0
+        self.bytes = 0
+        self.droppedSamples = 0
+        self.writeTime = 0.0
+        self.error = None
+        self._file = open(path, 'wb')
+        writeHeader(self._file, columnnames, rate)
+        self.startTime = time.perf_counter()
+        self.start()
+
+    def write(self, block):
+        rows = np.ascontiguousarray(np.asarray(block, dtype = DTYPE).reshape(self.columns, -1).T)
+        try:
+            self.queue.put_nowait(rows)
+        except queue.Full:
+            self.droppedSamples += rows.shape[0]
+
+    def run(self):
+        lastFlush = time.perf_counter()
+        while True:
+            rows = self.queue.get()
+            if rows is None:
+                break
+            if self.error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                self._file.write(rows.tobytes())
+                if start - lastFlush > self.flushInterval:
+                    self._file.flush()
+                    lastFlush = start
+            except OSError as e:
+                self.error = e
+                print("StreamRecorder: write failed:", e)
+                continue
+            self.writeTime += time.perf_counter() - start
+            self.samples += rows.shape[0]
+            self.bytes += rows.nbytes
+        self._file.close()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.startTime
+        return {
+            "path": str(self.path),
+            "samples": self.samples,
+            "bytes": self.bytes,
+            "droppedSamples": self.droppedSamples,
+            "queuedBlocks": self.queue.qsize(),
+            "seconds": elapsed,
+            "samplesPerSecond": self.samples/elapsed if elapsed > 0 else 0.0,
+            "diskMBPerSecond": self.bytes/self.writeTime/1e6 if self.writeTime > 0 else 0.0,
+            }
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        return self.stats()
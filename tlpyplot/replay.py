@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+replay: Play back a capture written by the recorder through a memory map, with the same readAvailable()/read()/rate()/columnnames() surface as a SyncStream, so the plots and noise analysis run unchanged on recorded data.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import os
+import time
+import numpy as np
+from .recorder import readHeader, HEADER_SIZE
+
+class ReplayStream:
+    def __init__(self, path, speed=1.0, chunk=65536, idle=0.1):
+        # speed is a multiple of real time; None or 0 plays as fast as possible,
+        # handing out up to `chunk` samples per readAvailable()
+        self.path = path
+        self.header = readHeader(path)
+        self.names = self.header["columns"]
+        dtype = np.dtype(self.header["dtype"])
+        rows = (os.path.getsize(path) - HEADER_SIZE) // (dtype.itemsize*len(self.names))
+        self.data = np.memmap(path, dtype = dtype, mode = 'r', offset = HEADER_SIZE,
+                              shape = (rows, len(self.names)))
+        self.speed = speed
+        self.chunk = chunk
+        self.idle = idle
+        self.position = 0
+        self._clockStart = None
+        self._clockPosition = 0
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def finished(self):
+        return self.position >= len(self)
+
+    def rate(self):
+        return self.header["rate"]
+
+    def columnnames(self, timeaxis=True, withName=True):
+        return list(self.names) if timeaxis else list(self.names[1:])
+
+    def seek(self, position):
+        self.position = min(max(int(position), 0), len(self))
+        self._clockStart = None
+
+    def queueSize(self):
+        if not self.speed:
+            return min(self.chunk, len(self) - self.position)
+        now = time.perf_counter()
+        if self._clockStart is None:
+            self._clockStart = now
+            self._clockPosition = self.position
+        due = self._clockPosition + int((now - self._clockStart)*self.rate()*self.speed)
+        return min(due, len(self)) - self.position
+
+    def read(self, samples=1, duration=None, timeaxis=True, flush=True):
+        if duration is not None:
+            samples = int(duration*self.rate())
+        # Never wait for samples past the end of the file
+        samples = min(samples, len(self) - self.position)
+        while self.speed:
+            missing = samples - self.queueSize()
+            if missing <= 0:
+                break
+            time.sleep(max(min(missing/(self.rate()*self.speed), self.idle), 0))
+        return self._take(samples, timeaxis)
+
+    def readAvailable(self, timeaxis=True):
+        samples = self.queueSize()
+        if samples < 1:
+            # Wait like a device would, but never hang at the end of the file
+            if self.finished:
+                time.sleep(self.idle)
+                return self._take(0, timeaxis)
+            samples = 1
+        return self.read(samples = samples, timeaxis = timeaxis)
+
+    def _take(self, samples, timeaxis):
+        block = self.data[self.position:self.position+samples].T
+        self.position += block.shape[1]
+        return block if timeaxis else block[1:]
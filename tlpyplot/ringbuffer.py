@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+ringbuffer: Preallocated multi-channel sample buffer backing the live plots. All channels share one contiguous float array so the most recent window can be handed to matplotlib as a zero-copy view.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+
+class RingBuffer:
+    """Fixed-length window over the last `length` samples of `channels` channels.
+
+    Storage is twice the window length. Samples are appended at the write
+    position and, when the storage runs out, the live window is moved back to
+    the front in a single slice copy. The window is therefore always contiguous
+    and view() never copies.
+    """
+    def __init__(self, channels, length, dtype=float):
+        self.channels = channels
+        self.length = max(int(length), 1)
+        self._data = np.empty((channels, 2*self.length), dtype=dtype)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def extend(self, block):
+        block = np.asarray(block, dtype=self._data.dtype).reshape(self.channels, -1)
+        n = block.shape[1]
+        if n == 0:
+            return
+        if n >= self.length:
+            self._data[:, :self.length] = block[:, n-self.length:]
+            self._start = 0
+            self._end = self.length
+            return
+        if self._end + n > self._data.shape[1]:
+            keep = min(len(self), self.length - n)
+            self._data[:, :keep] = self._data[:, self._end-keep:self._end]
+            self._start = 0
+            self._end = keep
+        self._data[:, self._end:self._end+n] = block
+        self._end += n
+        self._start = max(self._start, self._end - self.length)
+
+    def view(self):
+        return self._data[:, self._start:self._end]
+
+    def resize(self, length):
+        length = max(int(length), 1)
+        keep = min(len(self), length)
+        data = np.empty((self.channels, 2*length), dtype=self._data.dtype)
+        data[:, :keep] = self._data[:, self._end-keep:self._end]
+        self._data = data
+        self.length = length
+        self._start = 0
+        self._end = keep
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+scheduler: One frame scheduler for all live figures sharing a GUI event loop. It measures what every figure costs to update and draw, stretches the refresh intervals when together they would take more than a set share of the CPU, slows down hidden figures and skips frames when no new samples have arrived.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import time
+from .metrics import drawTimer
+
+def _overlaps(a, b):
+    return (a.winfo_x() < b.winfo_x() + b.winfo_width() and b.winfo_x() < a.winfo_x() + a.winfo_width() and
+            a.winfo_y() < b.winfo_y() + b.winfo_height() and b.winfo_y() < a.winfo_y() + a.winfo_height())
+
+def _covered(widget):
+    """True when a sibling stacked above `widget`, or above one of its
+    ancestors, overlaps it: a page that tkraise() put behind another is
+    still viewable as far as Tk is concerned."""
+    while widget.master is not None and widget.winfo_toplevel() is not widget:
+        # Tk lists children in stacking order, lowest first
+        siblings = widget.master.winfo_children()
+        for sibling in siblings[siblings.index(widget) + 1:]:
+            if sibling.winfo_toplevel() is not sibling and sibling.winfo_ismapped() and _overlaps(widget, sibling):
+                return True
+        widget = widget.master
+    return False
+
+class _Entry:
+    def __init__(self, fig, callback, interval, counter, redraw):
+        self.fig = fig
+        self.callback = callback
+        self.interval = interval
+        self.counter = counter
+        self.redraw = redraw
+        self.due = 0.0
+        self.cost = None
+        self.frames = 0
+        self.skipped = 0
+        self.errors = 0
+        self.renderTime = 0.0
+        self.lastCount = None
+        # Deferred redraws (draw_idle, relayouts) land outside the callback,
+        # so they are timed where they run and charged to the next frame
+        drawTimer(fig).add(self._addRenderTime)
+
+    def _addRenderTime(self, seconds):
+        self.renderTime += seconds
+
+    def visible(self):
+        widget = getattr(self.fig.canvas, 'get_tk_widget', None)
+        if widget is None:
+            return True
+        try:
+            widget = widget()
+            return bool(widget.winfo_viewable()) and not _covered(widget)
+        except Exception: # widget already destroyed
+            return False
+
+class FrameScheduler:
+    """Runs figure updates from a single timer on the GUI thread.
+
+    `after(ms, func)` schedules a callback on the event loop, e.g. the
+    after() method of the Tk root. Each figure asks for an interval; when the
+    measured costs would use more than `budget` of the wall clock, every
+    interval is stretched by the same factor, up to `maxInterval`. Figures
+    that are not viewable, or are covered by a page raised above theirs,
+    refresh every `hiddenInterval`.
+    """
+    def __init__(self, after, budget=0.5, hiddenInterval=2.0, maxInterval=5.0):
+        self.after = after
+        self.budget = budget
+        self.hiddenInterval = hiddenInterval
+        self.maxInterval = maxInterval
+        self.entries = []
+        self.running = False
+
+    def add(self, fig, callback, interval=0.1, counter=None, redraw=True):
+        # counter() returns the number of samples behind the figure; frames
+        # where it has not changed are skipped. redraw requests a draw_idle()
+        # after the callback, as FuncAnimation does without blitting
+        entry = _Entry(fig, callback, interval, counter, redraw)
+        self.entries.append(entry)
+        return entry
+
+    def addPlotter(self, plotter, interval=0.1):
+        # Only threaded plotters ingest without animate(), so only they can skip
+        counter = (lambda: plotter.samplesIngested) if plotter.threaded else None
+        return self.add(plotter.fig, plotter.animate, interval, counter, redraw = not plotter.blit)
+
+    def remove(self, entry):
+        self.entries.remove(entry)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.after(0, self._tick)
+
+    def stop(self):
+        self.running = False
+
+    def stretch(self):
+        load = sum(entry.cost/entry.interval for entry in self.entries
+                   if entry.cost is not None and entry.visible())
+        return max(1.0, load/self.budget)
+
+    def effectiveInterval(self, entry, stretch=None):
+        if not entry.visible():
+            return max(entry.interval, self.hiddenInterval)
+        if stretch is None:
+            stretch = self.stretch()
+        return min(entry.interval*stretch, max(self.maxInterval, entry.interval))
+
+    def _tick(self):
+        if not self.running:
+            return
+        delay = self.hiddenInterval
+        try:
+            delay = self.step()
+        finally:
+            if self.running:
+                self.after(int(1000*delay), self._tick)
+
+    def step(self):
+        # Runs every due figure, earliest deadline first, and returns the
+        # seconds until the next one is due
+        now = time.perf_counter()
+        stretch = self.stretch()
+        for entry in sorted(self.entries, key = lambda entry: entry.due):
+            if entry.due > now:
+                continue
+            entry.due = now + self.effectiveInterval(entry, stretch)
+            try:
+                self._run(entry)
+            except Exception as e: # one failing figure must not stop the others
+                entry.errors += 1
+                print("FrameScheduler: frame failed:", repr(e))
+        if not self.entries:
+            return self.hiddenInterval
+        return max(min(entry.due for entry in self.entries) - time.perf_counter(), 0.001)
+
+    def _run(self, entry):
+        if entry.counter is not None:
+            count = entry.counter()
+            if count == entry.lastCount:
+                entry.skipped += 1
+                return
+            entry.lastCount = count
+        start = time.perf_counter()
+        entry.callback()
+        if entry.redraw:
+            entry.fig.canvas.draw_idle()
+        cost = time.perf_counter() - start + entry.renderTime
+        entry.renderTime = 0.0
+        entry.cost = cost if entry.cost is None else 0.8*entry.cost + 0.2*cost
+        entry.frames += 1
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+simulate: Synthetic stand-in for tldevicesync.DeviceSync, opened with URLs such as sim://vmr?rate=2000&channels=3. It exposes the routes, protocol stream lists, device names and stream objects the viewers use, and generates noise, tones and drift in real time (vectorised, so tens of kHz are fine).
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+
+URL parameters (all optional):
+    rate      samples per second of every stream (default 1000)
+    channels  columns of the vector stream (default 3)
+    devices   number of sensors behind a sim://sync hub (default 2)
+    noise     white noise amplitude per sample (default 0.05)
+    tone      comma separated tone frequencies in Hz (default 60)
+    amp       tone amplitude (default 0.5)
+    drift     linear drift per second (default 0.01)
+    offset    constant added to every channel (default 0)
+    seed      random seed
+"""
+
+import threading
+import time
+import urllib.parse
+import zlib
+import numpy as np
+
+class SimStream:
+    def __init__(self, device, sourceName, columns, model):
+        self._device = device
+        self._sourceName = sourceName
+        self._columns = columns
+        self._model = model
+        self._position = None
+        self._lock = threading.Lock()
+
+    def __call__(self, samples=1, duration=None, flush=True, timeaxis=False, simplify_single=True):
+        rate = self.rate()
+        if duration is not None:
+            samples = int(duration*rate)
+        with self._lock:
+            due = self._device._due(rate)
+            if flush or self._position is None:
+                self._position = due
+            wait = (self._position + samples - due)/rate
+            if wait > 0:
+                time.sleep(wait)
+            t = (self._position + np.arange(samples))/rate
+            self._position += samples
+            data = list(self._model(t, len(self._columns)))
+        if timeaxis:
+            data = [t] + data
+        elif simplify_single and samples == 1:
+            data = [float(column[0]) for column in data]
+        return data
+
+    def rate(self):
+        return self._device._rate
+
+    def columnnames(self, withName = True):
+        names = [self._sourceName + "." + column for column in self._columns]
+        if withName:
+            routing = "/" + self._device._route.strip("/")
+            names = [self._device._name + " " + routing + " " + name for name in names]
+        return names
+
+    def queueSize(self):
+        if self._position is None:
+            return 0
+        return max(self._device._due(self.rate()) - self._position, 0)
+
+class _Value:
+    # Stand-in for a read/write RPC such as dev.name() or therm.pid.setpoint(40)
+    def __init__(self, value, onSet=None):
+        self.value = value
+        self.onSet = onSet
+
+    def __call__(self, value=None):
+        if value is not None:
+            self.value = value
+            if self.onSet is not None:
+                self.onSet(value)
+        return self.value
+
+class _Namespace:
+    pass
+
+class SimDevice:
+    def __init__(self, name, route, rate):
+        self._name = name
+        self._route = route
+        self._rate = rate
+        self._t0 = time.perf_counter()
+        self._shortname = name.lower().replace(" ", "_")
+        self.dev = _Namespace()
+        self.dev.name = _Value(name)
+        self.dev.serial = _Value("SIM%04d" % (zlib.crc32((name + route).encode()) % 10000))
+        self.dev.firmware = _Namespace()
+        self.dev.firmware.hash = _Value("simulated")
+        self.dev.firmware.serial = self.dev.serial
+        self.data = _Namespace()
+        self.data.rate = _Value(rate, self._setRate)
+        self._tio = _Namespace()
+        self._tio.name = name
+        self._tio.desc = name + " (simulated)"
+        self._tio.protocol = _Namespace()
+        self._tio.protocol.streams = []
+
+    def _setRate(self, rate):
+        # Keep the sample clock continuous across rate changes
+        elapsed = time.perf_counter() - self._t0
+        self._t0 = time.perf_counter() - elapsed*self._rate/float(rate)
+        self._rate = float(rate)
+
+    def _due(self, rate):
+        return int((time.perf_counter() - self._t0)*rate)
+
+    def _addStream(self, sourceName, columns, model):
+        stream = SimStream(self, sourceName, columns, model)
+        self._tio.protocol.streams.append({'source_name': sourceName})
+        parent = self
+        parts = sourceName.split(".")
+        for part in parts[:-1]:
+            if not hasattr(parent, part):
+                setattr(parent, part, _Namespace())
+            parent = getattr(parent, part)
+        setattr(parent, parts[-1], stream)
+        return stream
+
+def signalModel(noise=0.05, tones=(60.0,), amp=0.5, drift=0.01, offset=0.0, seed=None):
+    rng = np.random.default_rng(seed)
+    tones = np.asarray(tones, dtype = float)
+    def model(t, channels):
+        phases = np.arange(channels)[:, None]*2*np.pi/max(channels, 1)
+        data = np.full((channels, len(t)), float(offset))
+        data += drift*t
+        for f in tones:
+            data += amp*np.sin(2*np.pi*f*t + phases)
+        data += noise*rng.standard_normal(data.shape)
+        return data
+    return model
+
+class SimDeviceSync:
+    """Simulated DeviceSync. The host part of the URL picks the setup:
+
+    vmr   a single vector magnetometer with vector, bar and therm streams
+    sync  a SYNC hub with `devices` VMRs on routes 0, 1, ...
+    cb    the cell bakeout setup used by cb_view (heater therm with a PID
+          setpoint and an ion pump pressure gauge)
+    """
+    def __init__(self, url="sim://vmr"):
+        parsed = urllib.parse.urlparse(url)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        kind = (parsed.netloc or parsed.path.strip("/") or "vmr").lower()
+        rate = float(params.get("rate", 1000))
+        channels = int(params.get("channels", 3))
+        seed = params.get("seed")
+        seed = int(seed) if seed is not None else None
+        tones = [float(f) for f in params.get("tone", "60").split(",") if f]
+        model = signalModel(noise = float(params.get("noise", 0.05)),
+                            tones = tones,
+                            amp = float(params.get("amp", 0.5)),
+                            drift = float(params.get("drift", 0.01)),
+                            offset = float(params.get("offset", 0)),
+                            seed = seed)
+        self._routes = {}
+        if kind == "vmr":
+            self._addVMR("/", rate, channels, model)
+        elif kind == "sync":
+            hub = SimDevice("SYNC", "/", rate)
+            self._addDevice(hub)
+            for i in range(int(params.get("devices", 2))):
+                self._addVMR(str(i), rate, channels, model)
+        elif kind == "cb":
+            self._addBakeout(rate, seed)
+        else:
+            raise ValueError("Unknown simulated device: " + kind)
+
+    def _addDevice(self, device):
+        self._routes[device._route] = device
+        self.__dict__[device._shortname + device._route.replace("/", "")] = device
+
+    def _addVMR(self, route, rate, channels, model):
+        device = SimDevice("VMR", route, rate)
+        axes = ["x", "y", "z"] + ["c%d" % i for i in range(3, channels)]
+        device._addStream("vector", axes[:channels], model)
+        device._addStream("bar", ["pressure"], signalModel(noise = 0.01, tones = (), drift = 0, offset = 101.3))
+        device._addStream("therm", ["temperature"], signalModel(noise = 0.002, tones = (), drift = 0.001, offset = 25))
+        self._addDevice(device)
+
+    def _addBakeout(self, rate, seed):
+        heater = SimDevice("String 1 TCAC Reaction6", "/", rate)
+        state = {"temperature": 25.0, "t": None}
+        setpoint = _Value(25.0)
+        def thermModel(t, channels):
+            # First order approach of the setpoint with a 10 minute time constant
+            if state["t"] is None:
+                state["t"] = t[0]
+            dt = np.diff(np.r_[state["t"], t])
+            decay = np.exp(-np.cumsum(dt)/600.0)
+            temperature = setpoint() + (state["temperature"] - setpoint())*decay
+            state["temperature"] = temperature[-1]
+            state["t"] = t[-1]
+            power = np.clip(5*(setpoint() - temperature), 0, 100)
+            return np.array([temperature, np.full(len(t), float(setpoint())), power])[:channels]
+        therm = heater._addStream("therm", ["temperature", "setpoint", "power"], thermModel)
+        therm.pid = _Namespace()
+        therm.pid.setpoint = setpoint
+        self._addDevice(heater)
+        pump = SimDevice("UION", "0", rate)
+        pump._addStream("pressure", ["pressure"], signalModel(noise = 1e-10, tones = (), drift = -1e-12, offset = 1e-7, seed = seed))
+        self._addDevice(pump)
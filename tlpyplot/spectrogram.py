@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+spectrogram: Streaming short-time Fourier transform for waterfall plots. Only segments completed by newly arrived samples are transformed; each becomes one log-binned column of a fixed size rolling image, so a refresh costs time in proportion to the new data and memory is set by the history depth.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+from .analysis import logBin
+from .autoscale import RunningExtrema
+from .ringbuffer import RingBuffer
+from .welch import segmentSpectra
+
+class StreamingSpectrogram:
+    """Rolling image of log10 amplitude spectral density.
+
+    Spectra of all channels are added in quadrature into one column per
+    segment, binned onto `bins` logarithmic frequencies with logBin. The
+    image holds `depth` columns, oldest first; columns not yet filled are
+    NaN.
+    """
+    def __init__(self, Fs, channels, nperseg, depth, overlap=0.5, bins=200, window='blackmanharris'):
+        self.Fs = Fs
+        self.channels = channels
+        self.nperseg = int(nperseg)
+        self.step = max(self.nperseg - int(self.nperseg*overlap), 1)
+        self.depth = int(depth)
+        self.bins = bins
+        import scipy.signal # deferred so that importing tlpyplot stays fast
+        self.window = scipy.signal.get_window(window, self.nperseg)
+        self.scale = 1.0/(Fs*np.sum(self.window**2))
+        self._freqs = np.fft.rfftfreq(self.nperseg, 1.0/Fs)[1:]
+        self.freqs = logBin(self._freqs, np.zeros(len(self._freqs)), N = bins)[0]
+        self.image = RingBuffer(len(self.freqs), self.depth)
+        self.range = RunningExtrema(2, self.depth, blockSize = 16)
+        self.clear()
+
+    def clear(self):
+        self.image.clear()
+        self.image.extend(np.full((len(self.freqs), self.depth), np.nan))
+        self.range.clear()
+        self.dropPending()
+        self.columns = 0
+
+    def dropPending(self):
+        self._pending = np.empty((self.channels, 0))
+
+    @property
+    def columnInterval(self):
+        # Seconds between columns
+        return self.step/float(self.Fs)
+
+    def update(self, block):
+        block = np.asarray(block, dtype=float).reshape(self.channels, -1)
+        pending = np.concatenate((self._pending, block), axis = 1)
+        spec, used = segmentSpectra(pending, self.nperseg, self.step, self.window, self.scale)
+        self._pending = np.array(pending[:, used:])
+        nseg = spec.shape[1]
+        if nseg:
+            asd = np.sqrt(spec.sum(axis = 0)[:, 1:])
+            with np.errstate(divide='ignore'):
+                columns = np.log10(logBin(self._freqs, asd, N = self.bins)[1])
+            self.image.extend(columns.T)
+            self.range.extend(np.array([np.nanmin(columns, axis = 1), np.nanmax(columns, axis = 1)]))
+            self.columns += nseg
+        return nseg
+
+    def extrema(self):
+        # Lowest and highest value in the image, resolved to blocks of columns
+        lo, hi = self.range.extrema()
+        return lo[0], hi[1]
@@ -5,18 +5,59 @@ License: MIT
 Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
 """
 
-import tldevicesync
-import collections
+import os
+import threading
+import time
+import numpy as np
 import matplotlib.pyplot
-import matplotlib.animation
+from .ringbuffer import RingBuffer
+from .history import HistoryPyramid
+from .autoscale import RunningExtrema, hysteresisLimits
+from .decimate import minMaxDecimate, pixelColumns
+from .hub import AcquisitionHub
+from .gaps import insertBreaks
+from .recorder import StreamRecorder
 
 class TLPyPlot:
     def __init__(self,
                  queueLength,
                  streamList,
-                 xlabel="Time (s)"):
+                 xlabel="Time (s)",
+                 blit=False,
+                 decimate=True,
+                 threaded=False,
+                 metrics=None,
+                 history=None,
+                 filters=None,
+                 strip=False):
+        # history caps the samples kept at full rate; longer windows are drawn
+        # from the decimated tiers of a HistoryPyramid. None keeps the whole
+        # window at full rate. filters is a filter spec for the hub this
+        # plotter creates, e.g. 'notch:60,decimate:10'. strip draws every
+        # channel as a normalized trace in its own lane of a single axes
 
         self.pause = False
+        self.threaded = threaded
+        self.lock = threading.Lock()
+        self.reader = None
+        self.recorder = None
+        self._recordPath = None
+        self._recordSegment = 0
+        self.hub = None
+        self._ownHub = False
+        self.blit = blit
+        self.decimate = decimate
+        self.blitMargin = 0.2
+        self.yMargin = 0.2
+        self.background = None
+        self._canvas = None
+        self._drawId = None
+        self.metrics = metrics
+        self.overlayText = None
+        self.historyLength = history
+        self.history = None
+        self.filters = filters
+        self.strip = strip
         self.streamList = streamList
         self.queueLength = queueLength
         self.xlabel = xlabel
@@ -24,55 +65,411 @@ class TLPyPlot:
         matplotlib.rcParams['font.family'] = 'Palatino'
         self.fig = matplotlib.pyplot.figure()#constrained_layout=True)
         self.fig.subplots_adjust(left=0.08, right=0.97, top=0.96, bottom=0.12)
+        if self.metrics is not None:
+            self.metrics.timeDraws(self.fig)
 
         self.reinitialize(self.queueLength, self.streamList)
         self.animate()
 
     def reinitialize(self, queueLength, streamList):
         #self.tio = tldevicesync.DeviceSync(self.connectionPort)
-        self.ss = tldevicesync.SyncStream(streamList)
+        self.stopAcquisition()
+        self.queueLength = queueLength
+        self.streamList = streamList
+        self._attach(streamList)
+        self._allocate(queueLength)
+        self._buildAxes()
+        if self.threaded:
+            self.startAcquisition()
+
+    def reconfigure(self, streamList=None, queueLength=None, rate=None):
+        """Switch streams, window length or data rate in place.
+
+        The figure is only rebuilt when the number of channels changes;
+        otherwise axes and lines are reused and just relabelled. Pass `rate`
+        after the device rate has been changed: the stream is reopened, the
+        window keeps its duration and the buffered samples are resampled to
+        the new rate, so they stay on screen. A recording in progress carries on,
+        see _continueRecording.
+        """
+        newStreams = streamList is not None and streamList is not self.streamList
+        if newStreams or rate is not None:
+            oldRate = self.sampleRate
+            self.stopAcquisition()
+            if newStreams:
+                self.streamList = streamList
+            numStreams = self.numStreams
+            self._attach(self.streamList)
+            if newStreams or self.numStreams != numStreams:
+                self._allocate(queueLength or self.queueLength)
+                if self.numStreams != numStreams:
+                    self.fig.clf()
+                    self._buildAxes()
+                else:
+                    self._relabel()
+            else:
+                if queueLength is None:
+                    queueLength = max(int(round(self.queueLength*self.sampleRate/oldRate)), 1)
+                if self.sampleRate != oldRate:
+                    self._resample(queueLength)
+        if queueLength is not None and queueLength != self.queueLength:
+            self.changeQueueSize(queueLength)
+        self.background = None
+        self.fig.canvas.draw_idle()
+        if self.threaded:
+            self.startAcquisition()
+
+    def _attach(self, streamList):
+        if self.hub is not None:
+            self.hub.unsubscribe(self.ingest)
+            if self.recorder is not None:
+                self.hub.unsubscribe(self.recorder.write)
+        # A shared hub feeds several consumers from one read of the device;
+        # anything else gets a hub of its own
+        self._ownHub = not isinstance(streamList, AcquisitionHub)
+        if self._ownHub:
+            self.hub = AcquisitionHub(streamList, lock = self.lock, filters = self.filters)
+        else:
+            self.hub = streamList
+            self.lock = self.hub.lock
+        self.ss = self.hub.ss
+        self.sampleRate = float(self.ss.rate())
+        self.hub.subscribe(self.ingest)
+        self.numStreams = self.hub.channels
+        self._lastReaderTime = 0.0
+        self._continueRecording()
 
-        self.numStreams = len(self.ss.read(samples = 1))
+    def _allocate(self, queueLength):
+        with self.lock:
+            self.queueLength = queueLength
+            if self.historyLength is None:
+                self.buffer = RingBuffer(self.numStreams, queueLength)
+            else:
+                self.history = HistoryPyramid(self.numStreams, min(queueLength, self.historyLength), tierLength = self.historyLength//4)
+                self.buffer = self.history.raw
+            # Sized to the raw buffer; longer windows are scaled from the
+            # history envelope instead, see _historySnapshot
+            self.extrema = RunningExtrema(self.numStreams-1, self.buffer.length)
+            self.samplesIngested = 0
+            self._lastSamples = 0
+
+    def _buildAxes(self):
+        if self.strip:
+            self._buildStrip()
+            return
         self.gs = matplotlib.gridspec.GridSpec(self.numStreams-1,1,figure = self.fig, hspace = 0.1, wspace = 0.01)
-        self.data_t = collections.deque(maxlen = queueLength)
-        
-        self.alldata = []
         self.allax = []
         self.allaxline = []
         
         for i in range(1,self.numStreams): #pubQueueLength
-            self.alldata.append(collections.deque(maxlen = queueLength))
             self.allax.append(self.fig.add_subplot(self.gs[i-1]))
-            self.allaxline.append(matplotlib.lines.Line2D([],[],color = 'black', linewidth = 0.5))
+            self.allaxline.append(matplotlib.lines.Line2D([],[],color = 'black', linewidth = 0.5, animated = self.blit))
             self.allax[i-1].add_line(self.allaxline[i-1])
-            self.allax[i-1].set_ylabel(self.ss.columnnames()[i])
             if i == self.numStreams - 1:
                 self.allax[i-1].set_xlabel(self.xlabel)
             else:
                 matplotlib.pyplot.setp(self.allax[i-1].get_xticklabels(), visible = False)
+        self._relabel()
+        if self.metrics is not None and self.metrics.overlay:
+            self.overlayText = self.metrics.addOverlay(self.fig)
+            self.overlayText.set_animated(self.blit)
+        self.background = None
+
+    def _buildStrip(self):
+        # One axes and one LineCollection whatever the channel count; lane k
+        # runs from numStreams-2-k - 0.5 to + 0.5, the first channel on top
+        self.fig.subplots_adjust(left = 0.14)
+        ax = self.fig.add_subplot(1, 1, 1)
+        self.collection = matplotlib.collections.LineCollection([], colors = 'black', linewidths = 0.5, animated = self.blit)
+        ax.add_collection(self.collection)
+        ax.set_ylim(-0.5, self.numStreams - 1.5)
+        ax.set_yticks(np.arange(self.numStreams - 1))
+        ax.tick_params(axis = 'y', length = 0)
+        ax.set_xlabel(self.xlabel)
+        self.allax = [ax]
+        self.allaxline = [self.collection]
+        self._relabel()
+        if self.metrics is not None and self.metrics.overlay:
+            self.overlayText = self.metrics.addOverlay(self.fig)
+            self.overlayText.set_animated(self.blit)
+        self.background = None
+
+    def _relabel(self):
+        names = self.ss.columnnames()
+        if self.strip:
+            self.allax[0].set_yticklabels(names[:0:-1], fontsize = 'small')
+            self.collection.set_segments([])
+            self.laneLimits = np.tile([0.0, 1.0], (self.numStreams - 1, 1))
+            return
+        for i in range(1,self.numStreams):
+            self.allax[i-1].set_ylabel(names[i])
+            self.allaxline[i-1].set_data([], [])
+
+    def startAcquisition(self):
+        if self.reader is None:
+            self.reader = self.hub.start()
+
+    def stopAcquisition(self):
+        # A shared hub keeps reading for its other consumers
+        if self.reader is not None:
+            if self._ownHub:
+                self.hub.stop()
+            self.reader = None
+
+    def startRecording(self, path):
+        self.stopRecording()
+        # The recorder is a consumer of the hub in its own right, so it keeps
+        # every sample even while the plot is paused
+        self._recordPath = path
+        self._recordSegment = 0
+        self.recorder = StreamRecorder(path, self.ss.columnnames(), self.ss.rate())
+        self.hub.subscribe(self.recorder.write)
+
+    def _continueRecording(self):
+        # Called by _attach once the new hub is in place. The recording goes
+        # on from the new hub; samples at another rate or with other columns
+        # cannot share the file header, so they go to the next segment,
+        # FILE.1.tlr, FILE.2.tlr and so on
+        recorder = self.recorder
+        if recorder is None:
+            return
+        if list(self.ss.columnnames()) != recorder.columnnames or float(self.ss.rate()) != recorder.rate:
+            self._closeRecorder(recorder)
+            self._recordSegment += 1
+            root, ext = os.path.splitext(self._recordPath)
+            path = "%s.%d%s" % (root, self._recordSegment, ext)
+            print("Stream changed, recording continues in " + path)
+            self.recorder = StreamRecorder(path, self.ss.columnnames(), self.ss.rate())
+        self.hub.subscribe(self.recorder.write)
+
+    def stopRecording(self):
+        recorder = self.recorder
+        self.recorder = None
+        if recorder is None:
+            return None
+        self.hub.unsubscribe(recorder.write)
+        return self._closeRecorder(recorder)
+
+    def _closeRecorder(self, recorder):
+        stats = recorder.close()
+        print("Recorded %d samples to %s (%.0f samples/s, %.1f MB/s to disk, %d dropped)"
+              % (stats["samples"], stats["path"], stats["samplesPerSecond"],
+                 stats["diskMBPerSecond"], stats["droppedSamples"]))
+        return stats
+
+    @property
+    def data_t(self):
+        return self.buffer.view()[0]
+
+    @property
+    def alldata(self):
+        return self.buffer.view()[1:]
+
+    def _resample(self, queueLength):
+        # Interpolates the buffered samples onto the new sample rate, ending at
+        # the newest sample. NaN break markers spread to the interval around
+        # them, so lines still stop at the gaps
+        with self.lock:
+            data = self.buffer.view()
+            t = data[0]
+            backwards = np.flatnonzero(np.diff(t) <= 0)
+            start = backwards[-1] + 1 if len(backwards) else 0
+            length = queueLength if self.history is None else min(queueLength, self.historyLength)
+            if len(t) - start > 1:
+                tNew = t[-1] - np.arange(length)[::-1]/self.sampleRate
+                tNew = tNew[tNew >= t[start]]
+                resampled = np.empty((data.shape[0], len(tNew)))
+                resampled[0] = tNew
+                for i in range(1, data.shape[0]):
+                    resampled[i] = np.interp(tNew, t[start:], data[i, start:])
+            else:
+                resampled = np.array(data[:, start:])
+            self.queueLength = queueLength
+            self.buffer.clear()
+            self.buffer.resize(length)
+            self.buffer.extend(resampled)
+            self.extrema.resize(length)
+            self.extrema.clear()
+            self.extrema.extend(resampled[1:])
 
     def changeQueueSize(self, size):
-        newT = collections.deque(maxlen = size)
-        newT.extend(self.data_t)
-        self.data_t = newT
-        newData = []
-        for i in range(1, self.numStreams):
-            newData.append(collections.deque(maxlen = size))
-            newData[i-1].extend(self.alldata[i-1])
-        self.alldata = newData
+        with self.lock:
+            self.queueLength = size
+            if self.history is not None:
+                self.history.resize(min(size, self.historyLength))
+            else:
+                self.buffer.resize(size)
+            self.extrema.resize(self.buffer.length)
+
+    def ingest(self, block):
+        # Called by the hub with self.lock held
+        if not self.pause:
+            samples = block.shape[1]
+            block = insertBreaks(block, self.hub.breaks, self.sampleRate)
+            if self.history is not None:
+                self.history.extend(block)
+            else:
+                self.buffer.extend(block)
+            self.extrema.extend(block[1:])
+            self.samplesIngested += samples
+
+    def snapshot(self):
+        level = self.history.level(self.queueLength) if self.history is not None else None
+        if level is not None:
+            return self._historySnapshot(level)
+        with self.lock:
+            data = self.buffer.view()
+            if data.shape[1] == 0:
+                return None
+            span = (data[0][0], data[0][-1], data.shape[1])
+            xs, ys = self._lineData(data)
+            if self.hub.reader is not None and np.may_share_memory(ys, data):
+                xs, ys = np.array(xs), np.array(ys)
+            extrema = self.extrema.extrema()
+        return span, xs, ys, extrema
+
+    def _historySnapshot(self, level):
+        with self.lock:
+            envelope = self.history.envelope(level, self.queueLength)
+            if envelope is None:
+                return None
+            t, y, buckets = envelope
+            size = self.history.bucketSize(level)
+        # The envelope is at most one tier long, so scanning it is cheap
+        extrema = (np.fmin.reduce(y, axis = 1, initial = np.inf), np.fmax.reduce(y, axis = 1, initial = -np.inf))
+        # Expressed in raw samples so the blit x-limits come out the same
+        span = (t[0], t[-1], (buckets - 1)*size + 1)
+        if self.decimate:
+            xs, ys = minMaxDecimate(t, y, pixelColumns(self.allax[0]))
+        else:
+            xs, ys = np.broadcast_to(t, y.shape), y
+        return span, xs, ys, extrema
 
     def animate(self,*args):
-        dataLoad = self.ss.readAvailable()
-        for i in range(len(dataLoad)):
-            if type(dataLoad[i]) is not list:
-                dataLoad[i] = [dataLoad[i]]#[self.ss.read(samples = 1)[i]]
-            if not self.pause:
-                if i == 0:
-                    self.data_t.extend(dataLoad[i])
-                else:
-                    self.alldata[i-1].extend(dataLoad[i])
-                    self.allaxline[i-1].set_data(self.data_t, self.alldata[i-1])
-                    self.allax[i-1].set_xlim(self.data_t[0], self.data_t[-1])
-                    self.allax[i-1].relim()
-                    self.allax[i-1].autoscale_view()
+        start = time.perf_counter()
+        if self.hub.reader is None:
+            self.hub.poll()
+        ingested = time.perf_counter()
+        if self.pause:
+            return
+        frame = self.snapshot()
+        if frame is None:
+            return
+        span, xs, ys, (lo, hi) = frame
+        if self.strip:
+            artists = self._stripFrame(span, xs, ys, lo, hi)
+        elif self.blit:
+            artists = self._blitFrame(span, xs, ys, lo, hi)
+        else:
+            artists = None
+            for i in range(1, self.numStreams):
+                self.allaxline[i-1].set_data(xs[i-1], ys[i-1])
+                self.allax[i-1].set_xlim(span[0], span[1])
+                limits = hysteresisLimits(lo[i-1], hi[i-1], self.allax[i-1].get_ylim(), self.yMargin)
+                if limits is not None:
+                    self.allax[i-1].set_ylim(limits)
+        if self.metrics is not None:
+            self._recordFrame(start, ingested)
+        return artists
+
+    def _recordFrame(self, start, ingested):
+        now = time.perf_counter()
+        if self.reader is None:
+            ingest = ingested - start
+        else:
+            ingest = self.reader.ingestTime - self._lastReaderTime
+            self._lastReaderTime = self.reader.ingestTime
+        draw = now - ingested + self.metrics.takeRenderTime()
+        samples = self.samplesIngested - self._lastSamples
+        self._lastSamples = self.samplesIngested
+        self.metrics.fill = len(self.buffer)/float(self.queueLength)
+        self.metrics.extra["gaps"] = self.hub.gaps.gaps
+        self.metrics.extra["lost samples"] = self.hub.gaps.missing
+        queueSize = getattr(self.ss, 'readQueueSize', None) or getattr(self.ss, 'queueSize', None)
+        if queueSize is not None:
+            self.metrics.backlog = queueSize()
+        self.metrics.frame(start, ingest, draw, samples)
+        if self.overlayText is not None:
+            self.overlayText.set_text(self.metrics.text())
+
+    def _lineData(self, data):
+        if not self.decimate:
+            return [data[0]]*(self.numStreams-1), data[1:]
+        return minMaxDecimate(data[0], data[1:], pixelColumns(self.allax[0]))
+
+    def _connectCanvas(self):
+        # The Tk frontends swap in their own canvas after the figure is built
+        if self._canvas is self.fig.canvas:
+            return
+        if self._drawId is not None:
+            self._canvas.mpl_disconnect(self._drawId)
+        self._canvas = self.fig.canvas
+        self._drawId = self._canvas.mpl_connect('draw_event', self._onDraw)
+        self.background = None
+
+    def _onDraw(self, event):
+        self.background = self._canvas.copy_from_bbox(self.fig.bbox)
+        self._drawLines()
+
+    def _drawLines(self):
+        for ax, line in zip(self.allax, self.allaxline):
+            ax.draw_artist(line)
+        if self.overlayText is not None:
+            self.fig.draw_artist(self.overlayText)
+
+    def _updateLimits(self, ax, span, ymin, ymax):
+        relayout = self._updateWindow(ax, span)
+        limits = hysteresisLimits(ymin, ymax, ax.get_ylim(), self.yMargin)
+        if limits is not None:
+            ax.set_ylim(limits)
+            relayout = True
+        return relayout
+
+    def _updateWindow(self, ax, span):
+        # Blitting keeps the x-limits ahead of the data so most frames
+        # leave the axes untouched
+        t0, t1, n = span
+        if n > 1:
+            window = (t1 - t0) / (n - 1) * self.queueLength
+            x0, x1 = ax.get_xlim()
+            if t1 > x1 or abs((x1 - x0) - window*(1 + self.blitMargin)) > 0.05*window:
+                ax.set_xlim(t1 - window, t1 + window*self.blitMargin)
+                return True
+        return False
+
+    def _blitFrame(self, span, xs, ys, lo, hi):
+        self._connectCanvas()
+        relayout = False
+        for i in range(1, self.numStreams):
+            self.allaxline[i-1].set_data(xs[i-1], ys[i-1])
+            relayout |= self._updateLimits(self.allax[i-1], span, lo[i-1], hi[i-1])
+        self._blit(relayout)
+        return self.allaxline
+
+    def _blit(self, relayout):
+        if relayout or self.background is None:
+            self._canvas.draw_idle()
+        else:
+            self._canvas.restore_region(self.background)
+            self._drawLines()
+            self._canvas.blit(self.fig.bbox)
 
+    def _stripFrame(self, span, xs, ys, lo, hi):
+        # Each lane keeps its own hysteresis limits; the axes limits stay
+        # put, so only the time window ever forces a full redraw
+        for i in range(self.numStreams - 1):
+            limits = hysteresisLimits(lo[i], hi[i], self.laneLimits[i], self.yMargin)
+            if limits is not None:
+                self.laneLimits[i] = limits
+        low, high = self.laneLimits.T
+        gain = 0.9/(high - low)
+        offset = np.arange(self.numStreams - 2, -1, -1) - (low + high)/2*gain
+        ys = np.asarray(ys)*gain[:, None] + offset[:, None]
+        self.collection.set_segments(np.stack(np.broadcast_arrays(xs, ys), axis = -1))
+        ax = self.allax[0]
+        if self.blit:
+            self._connectCanvas()
+            self._blit(self._updateWindow(ax, span))
+            return self.allaxline
+        ax.set_xlim(span[0], span[1])
+        return None
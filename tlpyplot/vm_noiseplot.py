@@ -5,94 +5,50 @@ License: MIT
 Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
 """
 import threading
-import tldevicesync
+import time
 import matplotlib.pyplot
-import matplotlib.animation
 import numpy as np
-import scipy.signal
-
-def powerSpectralDensity(x, Fs):
-    freqs, psd = scipy.signal.periodogram(x, Fs, detrend='linear', scaling='density', window='blackmanharris')
-    psd = np.sqrt(psd)
-    freqs = freqs[1:] # Skip zero Hz element
-    psd = psd[1:]
-    return freqs, psd
-
-def logBin(freqs, psd, N=200, mode=1, verbosity=0):
-    xs = freqs
-    ys = psd
-    # mode = 0 is for normal average
-    # mode = 1 is for adding in quadrature
-    # Data must be ascending in frequency
-    if xs[0] == 0: # Avoid zero frequency
-        xs = xs[1:]
-        ys = ys[1:]
-    df = xs[1] - xs[0]
-    xmax = xs[-1]
-    xmin = xs[0]
-    maxlogx = np.log(xmax)
-    minlogx = np.log(xmin)
-    bins = np.exp(np.arange(N, dtype = float)/(N-1.)*(maxlogx-minlogx)+minlogx)
-    bins[0] = xmin
-    bins[-1] = xmax
-    binindex = 1
-    vi = 0
-    sumy = 0
-    sumx= 0
-    count = 0
-    binnedx = []
-    binnedy = []
-    try:
-        while vi < len(xs) and binindex < len(bins):
-            if verbosity>1:
-                print('This bin is for X between %1.9e and %1.9e; current X = %1.9e'
-                    %(bins[binindex-1], bins[binindex], xs[vi]))
-            if bins[binindex-1] <= xs[vi] <= bins[binindex]:
-                sumx = sumx + xs[vi]
-                count = count + 1
-                if mode == 0: sumy = sumy + ys[vi]
-                if mode == 1: sumy = sumy + ys[vi]**2
-                vi = vi + 1
-            else:
-                if xs[vi] > bins[binindex-1] and count == 0:
-                    binindex = binindex + 1
-                else:
-                    #print(count)
-                    binnedx.append(sumx/count)
-                    if mode == 0: binnedy.append(sumy/count)
-                    if mode == 1: binnedy.append(np.sqrt(sumy/count))
-                    sumy = 0
-                    sumx= 0
-                    count = 0
-                    binindex = binindex + 1
-    except:
-        print('logBin ERROR! Diagnostics:');
-        print('vi',vi)
-        print('binindex',binindex)
-        print('len(bins)',len(bins))
-        print("len(xs)",len(xs))
-        print('bins[binindex-1]',bins[binindex-1])
-        print("xs[vi]",xs[vi])
-        raise Exception("logBin Failed")
-    return np.array(binnedx),np.array(binnedy)
-
-def subtractPolynomial(xdata, ydata):
-    p = np.polyfit(xdata, ydata, 3)
-    poly = np.polyval(p,xdata)
-    ydata = ydata - poly
-    return ydata
+from .analysis import powerSpectralDensity, logBin, subtractPolynomial
+from .welch import StreamingWelch
+from .spectrogram import StreamingSpectrogram
+from .autoscale import hysteresisLimits
+from .gaps import contiguousTail, updateAcross
+from .noiseworker import NoiseWorker
 
 class vmNoise(threading.Thread):
-    def __init__(self, streamList, plotter):
+    def __init__(self, streamList, plotter, welchSegment=None, forget=None, processes=False, metrics=None, waterfall=None, waterfallSegment=1.0):
+        # With welchSegment (seconds) the spectrum is a running Welch average
+        # fed only with new samples instead of a periodogram of the window.
+        # With processes the periodogram runs in one worker process per axis
+        # and run() only collects finished spectra and draws them.
+        # waterfall (seconds of history) adds a spectrogram beside the
+        # spectrum, one column per half waterfallSegment.
         self.plotter = plotter
+        self.workers = None
+        if processes and welchSegment is None:
+            self.workers = [NoiseWorker(N=500) for index in range(3)]
+            self._latest = [[np.array([0,0]), np.array([0,0])] for index in range(3)]
+        self.welchSegment = welchSegment
+        self.forget = forget
+        self.welch = None
+        self.cursor = None
+        self.waterfall = waterfall
+        self.waterfallSegment = waterfallSegment
+        self.spectrogram = None
+        self.waterfallCursor = None
+        self.mesh = None
+        self.colorbar = None
+        self.metrics = metrics
         self.threadLock = threading.Lock()
         self.streamList = streamList
         matplotlib.rcParams['font.family'] = 'Palatino'
         self.fig = matplotlib.pyplot.figure()#constrained_layout=True)
         self.fig.subplots_adjust(left=0.08, right=0.97, top=0.97, bottom=0.22)
-        self.ss = tldevicesync.SyncStream(self.streamList)
 
-        self.gs = matplotlib.gridspec.GridSpec(1,1,figure = self.fig, hspace = 0.1, wspace = 0.01)
+        if waterfall:
+            self.gs = matplotlib.gridspec.GridSpec(1,2,figure = self.fig, hspace = 0.1, wspace = 0.25)
+        else:
+            self.gs = matplotlib.gridspec.GridSpec(1,1,figure = self.fig, hspace = 0.1, wspace = 0.01)
         self.xdata = []
         self.xfreq = []
         self.ydata = []
@@ -110,39 +66,56 @@ class vmNoise(threading.Thread):
         matplotlib.pyplot.legend()
         self.ax3.set_xlabel("Frequency (Hz)")
         self.ax3.set_ylabel("Noise (nT/$\sqrt{\mathrm{Hz}}$)")
+        if waterfall:
+            self.wax = self.fig.add_subplot(self.gs[1])
+            self.wax.set_yscale('log')
+            self.wax.set_xlabel("Time (s)")
+            self.wax.set_ylabel("Frequency (Hz)")
+        self.overlayText = None
+        if self.metrics is not None:
+            self.metrics.timeDraws(self.fig)
+            if self.metrics.overlay:
+                self.overlayText = self.metrics.addOverlay(self.fig)
         #self.ani = matplotlib.animation.FuncAnimation(self.fig, self.animate, interval=2000)
         self.run()
         
+    @property
+    def ss(self):
+        # The plotter's stream, read once by its hub; follows reinitialize()
+        return self.plotter.ss
+
     def run(self,*args):
         #self.threadLock.acquire(1) 
+        if self.waterfall:
+            self._updateWaterfall()
         def noise():
-            with self.threadLock:
-                data = self.plotter.alldata
             Fs = self.ss.rate()
+            if self.welchSegment is not None:
+                return self._welchNoise(Fs)
+            with self.plotter.lock:
+                data_t = np.array(self.plotter.data_t)
+                data = np.array(self.plotter.alldata)
+            # Only the span since the last dropout is evenly sampled
+            start = contiguousTail(data)
+            data_t, data = data_t[start:], data[:, start:]
 
-            def retrieveData(axis, data):
-                if axis == 'X':
-                    index = 0
-                elif axis == 'Y':
-                    index = 1
-                elif axis == 'Z':
-                    index = 2
-                if len(data[index]) > 2:
-                    data = subtractPolynomial(self.plotter.data_t, data[index])
-                    data = np.array(data)
-                    freqs, psd = powerSpectralDensity(data, Fs)
-                    freqs, psd = logBin(freqs, psd, N=500)
-                else:
-                    freqs = np.array([0,0])
-                    psd = np.array([0,0])
-                return [freqs, psd]
-
-            Xdata = retrieveData('X', data)
-            Ydata = retrieveData('Y', data)
-            Zdata = retrieveData('Z', data)
-            return (Xdata, Ydata, Zdata)
+            if data.shape[1] > 2:
+                detrended = np.array([subtractPolynomial(data_t, data[index]) for index in range(3)])
+                freqs, psd = powerSpectralDensity(detrended, Fs)
+                freqs, psd = logBin(freqs, psd, N=500)
+                return [[freqs, psd[index]] for index in range(3)]
+            return [[np.array([0,0]), np.array([0,0])] for index in range(3)]
         
-        newData = noise()
+        start = time.perf_counter()
+        if self.workers is not None:
+            newData = self._workerNoise()
+            if newData is None:
+                return
+            compute = max(worker.latency for worker in self.workers)
+        else:
+            newData = noise()
+            compute = time.perf_counter() - start
+        computed = time.perf_counter()
 
         with np.errstate(divide='ignore', invalid='ignore'):
             self.xfreq = np.log(newData[0][0])
@@ -157,10 +130,102 @@ class vmNoise(threading.Thread):
         self.ax3line.set_data(self.zfreq, self.zdata)
         self.ax3.relim()
         self.ax3.autoscale_view()
+        if self.metrics is not None:
+            self._recordFrame(start, computed, compute)
         #self.threadLock.release()
         #return self.ax1line#, self.ax2line, self.ax3line
 
-    def runInThread(self, *args):
-        thr = threading.Thread(daemon = True, target = self.run, args = (self, *args))
-        thr.start()
+    def _recordFrame(self, start, computed, compute):
+        draw = time.perf_counter() - computed + self.metrics.takeRenderTime()
+        self.metrics.fill = len(self.plotter.buffer)/float(self.plotter.queueLength)
+        if self.workers is not None:
+            self.metrics.extra["dropped requests"] = sum(worker.dropped for worker in self.workers)
+        if self.welch is not None:
+            self.metrics.extra["welch segments"] = self.welch.segments
+            self.metrics.extra["overrun samples"] = self.cursor.overrun
+        self.metrics.frame(start, compute, draw, len(self.plotter.buffer))
+        if self.overlayText is not None:
+            self.overlayText.set_text(self.metrics.text())
+
+    def _welchNoise(self, Fs):
+        if self.cursor is None or self.cursor.hub is not self.plotter.hub:
+            # first run, or the plotter was reinitialized onto a new hub
+            self.cursor = self.plotter.hub.cursor()
+            self.welch = None
+        with self.plotter.lock:
+            block = np.array(self.cursor.read()[1:4])
+            breaks = self.cursor.breaks
+        if self.welch is None or self.welch.Fs != Fs:
+            self.welch = StreamingWelch(Fs, 3, max(int(self.welchSegment*Fs), 8), forget = self.forget)
+        updateAcross(self.welch, block, breaks)
+        if self.welch.segments == 0:
+            return [[np.array([0,0]), np.array([0,0])] for index in range(3)]
+        freqs, psd = logBin(*self.welch.spectrum(), N=500)
+        return [[freqs, psd[index]] for index in range(3)]
+
+    def _updateWaterfall(self):
+        Fs = self.ss.rate()
+        if self.waterfallCursor is None or self.waterfallCursor.hub is not self.plotter.hub:
+            self.waterfallCursor = self.plotter.hub.cursor()
+            self.spectrogram = None
+        with self.plotter.lock:
+            block = np.array(self.waterfallCursor.read()[1:4])
+            breaks = self.waterfallCursor.breaks
+        if self.spectrogram is None or self.spectrogram.Fs != Fs:
+            self._buildWaterfall(Fs)
+        if not updateAcross(self.spectrogram, block, breaks):
+            return
+        self.mesh.set_array(self.spectrogram.image.view())
+        limits = hysteresisLimits(*self.spectrogram.extrema(), self.mesh.get_clim(), margin = 0.05)
+        if limits is not None:
+            self.mesh.set_clim(*limits)
+
+    def _buildWaterfall(self, Fs):
+        # The mesh is laid out once per rate: columns at fixed times before
+        # now, rows between the log-binned frequencies
+        nperseg = max(int(self.waterfallSegment*Fs), 8)
+        self.spectrogram = StreamingSpectrogram(Fs, 3, nperseg, max(int(self.waterfall*2/self.waterfallSegment), 2))
+        dt = self.spectrogram.columnInterval
+        times = (np.arange(self.spectrogram.depth + 1) - self.spectrogram.depth)*dt
+        freqs = self.spectrogram.freqs
+        middle = np.sqrt(freqs[1:]*freqs[:-1])
+        edges = np.r_[freqs[0]**2/middle[0], middle, freqs[-1]**2/middle[-1]]
+        if self.mesh is not None:
+            self.mesh.remove()
+        self.mesh = self.wax.pcolormesh(times, edges, self.spectrogram.image.view(), cmap = 'viridis', shading = 'flat')
+        self.mesh.set_clim(0, 1)
+        if self.colorbar is None:
+            self.colorbar = self.fig.colorbar(self.mesh, ax = self.wax, label = "log$_{10}$ noise (nT/$\\sqrt{\\mathrm{Hz}}$)")
+        else:
+            self.colorbar.update_normal(self.mesh)
+        self.wax.set_xlim(times[0], times[-1])
+        self.wax.set_ylim(edges[0], edges[-1])
+
+    def _workerNoise(self):
+        updated = False
+        for index, worker in enumerate(self.workers):
+            result = worker.poll()
+            if result is not None:
+                self._latest[index] = list(result)
+                updated = True
+        if all(worker.busy for worker in self.workers):
+            for worker in self.workers:
+                worker.dropped += 1
+        else:
+            Fs = self.ss.rate()
+            with self.plotter.lock:
+                data_t = np.array(self.plotter.data_t)
+                data = np.array(self.plotter.alldata[:3])
+            start = contiguousTail(data)
+            data_t, data = data_t[start:], data[:, start:]
+            if data.shape[1] > 2:
+                for index, worker in enumerate(self.workers):
+                    worker.submit(data_t, data[index], Fs)
+        return self._latest if updated else None
+
+    def close(self):
+        if self.workers is not None:
+            for worker in self.workers:
+                worker.close()
+            self.workers = None
 
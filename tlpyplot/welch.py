@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+welch: Streaming Welch power spectral density estimator. Samples are fed in as they arrive, only newly completed segments are transformed, and the averaged spectrum is available at any time with the same scaling as powerSpectralDensity.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import numpy as np
+
+def segmentSpectra(samples, nperseg, step, window, scale):
+    """One-sided power spectral density of every whole segment of `samples`
+    (channels, n), detrended and windowed like powerSpectralDensity.
+
+    Returns the spectra (channels, segments, frequencies) and the number of
+    samples consumed, i.e. where the next segment starts.
+    """
+    channels, n = samples.shape
+    if n < nperseg:
+        return np.empty((channels, 0, nperseg//2 + 1)), 0
+    import scipy.signal
+    nseg = (n - nperseg)//step + 1
+    starts = np.arange(nseg)*step
+    segs = samples[:, starts[:, None] + np.arange(nperseg)]
+    segs = scipy.signal.detrend(segs, axis = -1, type = 'linear')
+    spec = np.abs(np.fft.rfft(segs*window, axis = -1))**2 * scale
+    if nperseg % 2:
+        spec[..., 1:] *= 2
+    else:
+        spec[..., 1:-1] *= 2
+    return spec, nseg*step
+
+class StreamingWelch:
+    def __init__(self, Fs, channels, nperseg, overlap=0.5, window='blackmanharris', forget=None):
+        # forget is the weight kept by the running average per new segment;
+        # None (or 1) averages every segment since the last reset equally.
+        self.Fs = Fs
+        self.channels = channels
+        self.nperseg = int(nperseg)
+        self.step = max(self.nperseg - int(self.nperseg*overlap), 1)
+        self.forget = 1.0 if forget is None else float(forget)
+        import scipy.signal # deferred so that importing tlpyplot stays fast
+        self.window = scipy.signal.get_window(window, self.nperseg)
+        self.scale = 1.0/(Fs*np.sum(self.window**2))
+        self.freqs = np.fft.rfftfreq(self.nperseg, 1.0/Fs)
+        self.reset()
+
+    def reset(self, keepPending=False):
+        # keepPending carries the unfinished segment over into the new average
+        if not keepPending:
+            self._pending = np.empty((self.channels, 0))
+        self._sum = np.zeros((self.channels, len(self.freqs)))
+        self.weight = 0.0
+        self.segments = 0
+
+    def dropPending(self):
+        # At a gap in the data: the unfinished segment would span it
+        self._pending = np.empty((self.channels, 0))
+
+    def update(self, block):
+        block = np.asarray(block, dtype=float).reshape(self.channels, -1)
+        pending = np.concatenate((self._pending, block), axis = 1)
+        spec, used = segmentSpectra(pending, self.nperseg, self.step, self.window, self.scale)
+        nseg = spec.shape[1]
+        if nseg:
+            ages = self.forget**np.arange(nseg-1, -1, -1)
+            decay = self.forget**nseg
+            self._sum = decay*self._sum + np.einsum('s,csf->cf', ages, spec)
+            self.weight = decay*self.weight + ages.sum()
+            self.segments += nseg
+        self._pending = np.array(pending[:, used:])
+        return nseg
+
+    def spectrum(self):
+        # Amplitude spectral density without the zero Hz bin, like powerSpectralDensity
+        if self.weight == 0:
+            return self.freqs[1:], np.zeros((self.channels, len(self.freqs)-1))
+        return self.freqs[1:], np.sqrt(self._sum[:, 1:]/self.weight)
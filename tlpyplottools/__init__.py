@@ -1,3 +1,14 @@
-from .tioview import *
-from .vm_monitor import *
-from .cb_view import *
+import importlib
+
+# The viewers import tkinter and select the TkAgg backend, so they are only
+# loaded when used; --headless runs without touching either.
+_viewers = ("cb_view", "vm_monitor", "tioview")
+
+def __getattr__(name):
+    if name in _viewers or name in ("headless", "launch"):
+        return importlib.import_module("." + name, __name__)
+    for viewer in _viewers if not name.startswith("_") else ():
+        module = importlib.import_module("." + viewer, __name__)
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -6,7 +6,6 @@ Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf
 """
 
 import matplotlib
-import time
 import argparse
 import tkinter
 import tlpyplot
@@ -23,18 +22,49 @@ def changeQSize(widget, plotter, plotter2, tio):
     plotter.changeQueueSize(windowLength)
     plotter2.changeQueueSize(windowLength)
 
-def readTemp(tio):
-    return tio.string_1_tcac_reaction6.therm()[0]
+def readTemp(plotter):
+    # Latest temperature the hub delivered to the plot. Reading the therm
+    # stream itself would flush the queue the hub drains and drop samples
+    with plotter.lock:
+        temperature = plotter.alldata[0]
+        temperature = temperature[np.isfinite(temperature)]
+        return float(temperature[-1]) if len(temperature) else None
+
+# the running setpoint ramp, if any; replaced whenever a new setpoint is entered
+ramp = None
+rampSettings = {"rate": None, "tolerance": 3.0, "timeout": None, "poll": 5.0}
 
 def changeTemp(widget, plotter, plotter2, tio):
-    newTemp = widget.get()
-    currentTemp = readTemp(tio)
-    tio.string_1_tcac_reaction6.therm.pid.setpoint(int(newTemp))
-    tempDiff = abs(newTemp - currentTemp)
-    while tempDiff >= 3:
-        time.sleep(60*5)
-        currentTemp = readTemp(tio)
-        tempDiff = abs(newTemp - currentTemp)
+    global ramp
+    try:
+        profile = tlpyplot.parseProfile(str(widget.get()))
+    except ValueError:
+        popupmsg("Enter a setpoint, or a profile such as '80:2:600, 120' (target C : ramp C/min : hold s).")
+        return
+    for step in profile:
+        if step.rate is None:
+            step.rate = rampSettings["rate"]
+    stopRamp()
+    therm = tio.string_1_tcac_reaction6.therm
+    ramp = tlpyplot.SetpointRamp(lambda: readTemp(plotter), therm.pid.setpoint, profile,
+                                      tolerance = rampSettings["tolerance"],
+                                      timeout = rampSettings["timeout"],
+                                      poll = rampSettings["poll"])
+    ramp.start()
+
+def stopRamp():
+    if ramp is not None and not ramp.finished:
+        ramp.cancel()
+
+# popup message general function
+def popupmsg(msg):
+    popup = tkinter.Tk()
+    popup.wm_title("!")
+    label = tkinter.Label(popup, text = msg)
+    label.pack(side = 'top', fill = 'x', pady = 10)
+    B1 = tkinter.Button(popup, text = "Ok", command = popup.destroy)
+    B1.pack()
+    popup.mainloop()
 
 def upDownEntry(widget, direction, plotter, plotter2, tio, func):
     current = float(widget.get())
@@ -52,22 +82,42 @@ def processCommandLineArgs():
     parser.add_argument("url", 
                 nargs='?', 
                 default='tcp://localhost/',
-                help='URL: tcp://localhost')
+                help='URL: tcp://localhost, or sim://vmr, sim://sync, sim://cb for a simulated device')
+    parser.add_argument("--record",
+                metavar='FILE',
+                help='Record every sample to FILE_therm.tlr and FILE_pressure.tlr')
+    parser.add_argument("--history",
+                type=int,
+                default=200000,
+                metavar='SAMPLES',
+                help='Samples per stream kept at full rate; longer windows are drawn from decimated history')
+    parser.add_argument("--ramp-rate",
+                type=float,
+                metavar='C_PER_MIN',
+                help='Ramp the setpoint at this rate instead of stepping it')
+    parser.add_argument("--tolerance",
+                type=float,
+                default=3.0,
+                help='Temperature error in C at which a setpoint counts as reached')
+    parser.add_argument("--settle-timeout",
+                type=float,
+                metavar='MINUTES',
+                help='Give up on a setpoint not reached within this time')
     args = parser.parse_args()
-    tio = tlpyplot.tldevicesync.DeviceSync(args.url)
-    time.sleep(1)
-    return tio
+    tio = tlpyplot.openDevice(args.url)
+    return tio, args
 
 def saveData(plotter):
     f = tkinter.filedialog.asksaveasfile(mode = 'w', defaultextension = ".txt")
     if f is None:
         return
-    a = np.asarray(plotter.alldata)
+    with plotter.lock:
+        a = np.array(plotter.alldata)
     np.savetxt(f, a.T, delimiter=",")
     f.close()
 
-def createPlot(streamList, windowLength):
-    plotter = tlpyplot.TLPyPlot(queueLength = windowLength, streamList = streamList)
+def createPlot(streamList, windowLength, history = None):
+    plotter = tlpyplot.TLPyPlot(queueLength = windowLength, streamList = streamList, threaded = True, history = history)
     return plotter
 
 def setDefaults(tio):
@@ -140,11 +190,22 @@ class GraphPage(tkinter.Frame):
             e2.bind('<Up>', lambda event: upDownEntry(e2, "up", plotter, plotter2, tio, changeTemp))
             e2.bind('<Down>', lambda event: upDownEntry(e2, "down", plotter, plotter2, tio, changeTemp))
 
+            rampStatus = tkinter.Label(subsubframe, text = "", width = 48, anchor = 'w')
+            rampStatus.grid(column = 5, row = 0, padx = 10)
+
+            def showRampStatus():
+                rampStatus.config(text = ramp.status() if ramp is not None else "")
+                self.after(1000, showRampStatus)
+            showRampStatus()
+
             subsubframe2 = tkinter.Frame(subframe)
 
             quitbutton = tkinter.Button(subsubframe2, text = "Quit", command = quit)
             quitbutton.grid(column = 4, row = 0)
 
+            stopbutton = tkinter.Button(subsubframe2, text = "Stop Ramp", command = stopRamp)
+            stopbutton.grid(column = 2, row = 0)
+
             savebutton = tkinter.Button(subsubframe2, text = "Save", command = lambda: saveData(plotter))
             savebutton.grid(column = 3, row = 0, padx = 20)
 
@@ -169,24 +230,38 @@ class GraphPage(tkinter.Frame):
 
 def main():
     # get DeviceSync
-    tio = processCommandLineArgs()
+    tio, args = processCommandLineArgs()
+    rampSettings["rate"] = args.ramp_rate
+    rampSettings["tolerance"] = args.tolerance
+    if args.settle_timeout is not None:
+        rampSettings["timeout"] = 60*args.settle_timeout
     
     # get defaults for the graph 
     start_stream , start_length = setDefaults(tio)
     
     # create plot instance
-    plotter = createPlot(start_stream, start_length)
+    plotter = createPlot(start_stream, start_length, history = args.history)
     plotter.fig.delaxes(plotter.allax[1])
     plotter.fig.delaxes(plotter.allax[2])
     plotter.allax[0].change_geometry(1,1,1)
     plotter.allax[0].set_xlabel(plotter.xlabel)
-    plotter2 = createPlot([tio.uion0.pressure], 500)
+    plotter2 = createPlot([tio.uion0.pressure], 500, history = args.history)
+    if args.record:
+        plotter.startRecording(args.record + "_therm.tlr")
+        plotter2.startRecording(args.record + "_pressure.tlr")
     
     app = graphInterface(tio, plotter, plotter2, start_length)
     app.geometry("1290x900")
-    aniv = matplotlib.animation.FuncAnimation(plotter.fig, plotter.animate, interval = 100)
-    anim = matplotlib.animation.FuncAnimation(plotter2.fig, plotter2.animate, interval = 100)
-    app.mainloop()
+    scheduler = tlpyplot.FrameScheduler(app.after)
+    scheduler.addPlotter(plotter, interval = 0.1)
+    scheduler.addPlotter(plotter2, interval = 0.1)
+    scheduler.start()
+    try:
+        app.mainloop()
+    finally:
+        stopRamp()
+        plotter.stopRecording()
+        plotter2.stopRecording()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+headless: Unattended monitor for rack machines. Reads a device (or a replayed capture) at full rate without any GUI and prints periodic noise, statistics and dropout summaries as JSON lines or plain text. Started by `tioview --headless` or `vm_monitor --headless`.
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import argparse
+import json
+import sys
+import time
+import tlpyplot
+from tlpyplot.headless import HeadlessMonitor
+
+def processCommandLineArgs(prog, defaultStreams):
+    parser = argparse.ArgumentParser(prog=prog + ' --headless',
+                             description='Headless noise and statistics monitor')
+    parser.add_argument("url",
+                nargs='?',
+                default='tcp://localhost/',
+                help='URL: tcp://localhost, or sim://vmr, sim://sync, sim://cb for a simulated device')
+    parser.add_argument("--headless",
+                action='store_true',
+                help=argparse.SUPPRESS)
+    parser.add_argument("--streams",
+                default=defaultStreams,
+                help="Streams to monitor, e.g. 'vmr0.vector, vmr1.bar' (default: %s)" % (defaultStreams or 'first sensor stream'))
+    parser.add_argument("--replay",
+                metavar='FILE',
+                help='Monitor a capture file instead of connecting to a device')
+    parser.add_argument("--speed",
+                type=float,
+                default=0,
+                help='Replay speed as a multiple of real time (default 0: as fast as possible)')
+    parser.add_argument("--record",
+                metavar='FILE',
+                help='Record every sample to a binary capture file')
+    parser.add_argument("--interval",
+                type=float,
+                default=10.0,
+                metavar='SECONDS',
+                help='Time between summaries')
+    parser.add_argument("--duration",
+                type=float,
+                metavar='SECONDS',
+                help='Stop after this long (default: run until interrupted)')
+    parser.add_argument("--welch",
+                type=float,
+                default=1.0,
+                metavar='SECONDS',
+                help='Welch segment length of the noise estimate')
+    parser.add_argument("--forget",
+                type=float,
+                help='Carry the noise average across summaries, keeping this weight per segment')
+    parser.add_argument("--band",
+                type=float,
+                nargs=2,
+                default=[1.0, 10.0],
+                metavar=('LOW', 'HIGH'),
+                help='Frequency band in Hz over which the noise level is averaged')
+    parser.add_argument("--bins",
+                type=int,
+                default=0,
+                help='Add a log binned spectrum with this many bins to every summary')
+    parser.add_argument("--filter",
+                metavar='SPEC',
+                help="Filter and decimate the data before anything else sees it, e.g. 'notch:60,lowpass:100,decimate:10'")
+    parser.add_argument("--format",
+                choices=['json', 'text'],
+                default='json',
+                help='JSON lines or one line of text per channel')
+    parser.add_argument("-o", "--output",
+                metavar='FILE',
+                help='Append summaries to this file instead of stdout')
+    return parser.parse_args()
+
+def resolveStreams(tio, spec, meta):
+    # Same syntax as the stream entry box of tioview: 'vmr0.vector, vmr1.bar'
+    if not spec:
+        for key in meta.routes():
+            if "sync" not in meta.name(key).lower():
+                return [getattr(tio._routes[key], meta.streams(key)[0])]
+        raise ValueError("No sensor streams found")
+    streams = []
+    for name in spec.split(","):
+        deviceName, streamName = name.strip().split(".", 1)
+        obj = getattr(tio, deviceName.replace(" ", "_"))
+        for part in streamName.split("."):
+            obj = getattr(obj, part)
+        streams.append(obj)
+    return streams
+
+def formatText(record):
+    lines = ["%s  %d samples  %d gaps  %d missing" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["time"])),
+                                                    record["samples"], record["gaps"], record["missing"])]
+    for name, stats in record["channels"].items():
+        line = "  %s:" % name
+        if "mean" in stats:
+            line += "  mean %.6g  std %.3g  min %.6g  max %.6g" % (stats["mean"], stats["std"], stats["min"], stats["max"])
+        if "noise" in stats:
+            line += "  noise %.3g/rtHz" % stats["noise"]
+        lines.append(line)
+    return "\n".join(lines)
+
+def main(prog='tioview', defaultStreams=None):
+    args = processCommandLineArgs(prog, defaultStreams)
+    if args.forget is None and args.welch > args.interval:
+        print("Warning: Welch segments longer than the interval; some summaries will lack noise levels", file = sys.stderr)
+    if args.replay:
+        streams = tlpyplot.ReplayStream(args.replay, speed = args.speed)
+    else:
+        meta = tlpyplot.DeviceMetadata(args.url)
+        tio = tlpyplot.openDevice(args.url, expect = meta.expectedRoutes())
+        streams = resolveStreams(tio, args.streams, meta.attach(tio))
+    monitor = HeadlessMonitor(streams, interval = args.interval, welchSegment = args.welch,
+                              forget = args.forget, band = args.band, bins = args.bins, filters = args.filter)
+    if args.record:
+        monitor.startRecording(args.record)
+    output = open(args.output, 'a') if args.output else sys.stdout
+
+    def emit(record):
+        output.write((json.dumps(record) if args.format == 'json' else formatText(record)) + "\n")
+        output.flush()
+
+    try:
+        monitor.run(emit, duration = args.duration)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    main()
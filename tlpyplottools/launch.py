@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+launch: Console script entry points. --headless is dispatched before any viewer module is imported, so it runs on machines without Tk or a display. Without the console scripts installed, run python -m tlpyplottools.launch tioview|vm_monitor [options].
+License: MIT
+Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf.com>
+"""
+
+import importlib
+import sys
+
+def _launch(viewer, defaultStreams=None):
+    if "--headless" in sys.argv[1:]:
+        from .headless import main
+        main(prog = viewer, defaultStreams = defaultStreams)
+    else:
+        importlib.import_module("." + viewer, __package__).main()
+
+def tioview():
+    _launch("tioview")
+
+def vm_monitor():
+    _launch("vm_monitor", defaultStreams = "vmr.vector")
+
+if __name__ == "__main__":
+    viewers = {"tioview": tioview, "vm_monitor": vm_monitor}
+    if len(sys.argv) < 2 or sys.argv[1] not in viewers:
+        sys.exit("usage: python -m tlpyplottools.launch {tioview,vm_monitor} [options]")
+    sys.argv[0] = sys.argv.pop(1)
+    viewers[sys.argv[0]]()
@@ -6,7 +6,6 @@ Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf
 """
 
 import matplotlib
-import time
 import argparse
 import tkinter
 import tlpyplot
@@ -21,21 +20,51 @@ def processCommandLineArgs():
     parser.add_argument("url", 
                 nargs='?', 
                 default='tcp://localhost/',
-                help='URL: tcp://localhost')
+                help='URL: tcp://localhost, or sim://vmr, sim://sync, sim://cb for a simulated device')
+    parser.add_argument("--record",
+                metavar='FILE',
+                help='Record every sample to a binary capture file')
+    parser.add_argument("--replay",
+                metavar='FILE',
+                help='Play back a capture file instead of connecting to a device')
+    parser.add_argument("--speed",
+                type=float,
+                default=1.0,
+                help='Replay speed as a multiple of real time (0: as fast as possible)')
+    parser.add_argument("--blit",
+                action='store_true',
+                help='Only redraw the data lines between axis rescales')
+    parser.add_argument("--strip",
+                action='store_true',
+                help='Draw all channels as stacked traces in one plot, for setups with many channels')
+    parser.add_argument("--filter",
+                metavar='SPEC',
+                help="Filter and decimate the data before anything else sees it, e.g. 'notch:60,lowpass:100,decimate:10'")
+    parser.add_argument("--metrics",
+                action='store_true',
+                help='Show frame rate, ingest and draw times on the plots')
+    parser.add_argument("--metrics-log",
+                metavar='FILE',
+                help='Append periodic performance summaries to this JSON lines file')
+    parser.add_argument("--no-cache",
+                action='store_true',
+                help='Enumerate the connected devices instead of starting from the cached stream list')
+    # The console script dispatches --headless before this module, and with
+    # it Tk, is imported; see tlpyplottools.launch
+    parser.add_argument("--headless",
+                action='store_true',
+                help='Run without a GUI and print periodic noise and statistics summaries (see --headless --help)')
     args = parser.parse_args()
-    tio = tlpyplot.tldevicesync.DeviceSync(args.url)
-    time.sleep(1)
-    return tio
-
-def getStreams(tio):
-    deviceDict = {}
-    for device in tio._routes:
-        streams = []
-        pstreams = tio._routes[device]._tio.protocol.streams
-        for i in range(len(pstreams)):
-            streams.append(pstreams[i]['source_name'])
-        deviceDict[tio._routes[device]] = streams
-    return deviceDict
+    if args.headless:
+        parser.error("--headless runs through the tioview console script or python -m tlpyplottools.launch tioview")
+    tlpyplot.startup.mark("imports")
+    if args.replay:
+        return None, None, args
+    meta = tlpyplot.DeviceMetadata(args.url, useCache = not args.no_cache)
+    tio = tlpyplot.openDevice(args.url, expect = meta.expectedRoutes())
+    meta.attach(tio)
+    tlpyplot.startup.mark("device ready")
+    return tio, meta, args
 
 # popup message general function
 def popupmsg(msg):
@@ -54,11 +83,26 @@ def changeQSize(widget, plotter, tio):
     plotter.changeQueueSize(windowLength)
 
 def rateChange(widget, plotter, tio):
+    if tio is None:
+        popupmsg("The data rate of a replayed capture cannot be changed.")
+        return
     rate = widget.get()
     rate = float(rate)
-    plotter.ss.rate(rate)
-    plotter.fig.clf()
-    plotter.reinitialize(plotter.queueLength, plotter.streamList)
+    for device in streamDevices(tio, plotter.streamList):
+        device.data.rate(rate)
+    plotter.reconfigure(rate = rate)
+
+def streamDevices(tio, streamList):
+    # The devices whose streams are plotted; the data rate is a device setting
+    devices = []
+    for device in tio._routes.values():
+        for info in device._tio.protocol.streams:
+            stream = device
+            for part in info['source_name'].split("."):
+                stream = getattr(stream, part)
+            if any(stream is s for s in streamList) and device not in devices:
+                devices.append(device)
+    return devices
 
 def upDownEntry(widget, direction, plotter, tio, func):
     current = float(widget.get())
@@ -71,25 +115,19 @@ def upDownEntry(widget, direction, plotter, tio, func):
     func(widget, plotter, tio)
 
 # set initial stream list by looking at connected devices
-def setDefaults(tio):
+def setDefaults(tio, meta):
     start_length = 500
     defaultStream = "Enter Streams Here"
-    connectedDevices = getStreams(tio)
-    for key in tio._routes:
-        device = tio._routes[key]
-        if "sync" not in device.dev.name().lower():
-            name = device.dev.name().lower().replace(" ", "_")
-            if key == '/':
-                defaultStream = name + "." + connectedDevices[device][0]
-            else:
-                defaultStream = name + key + "." + connectedDevices[device][0]
-            stre = getattr(device, connectedDevices[device][0])
+    for key in meta.routes():
+        if "sync" not in meta.name(key).lower():
+            defaultStream = meta.labels(key)[0]
+            stre = getattr(tio._routes[key], meta.streams(key)[0])
             start_stream = [stre]
             break 
     return defaultStream, start_stream, start_length
 
-def createPlot(streamList, windowLength):
-    plotter = tlpyplot.TLPyPlot(queueLength = windowLength, streamList = streamList)
+def createPlot(streamList, windowLength, blit = False, metrics = None, filters = None, strip = False):
+    plotter = tlpyplot.TLPyPlot(queueLength = windowLength, streamList = streamList, threaded = True, blit = blit, metrics = metrics, filters = filters, strip = strip)
     return plotter
 
 def enterStream(widget, tio, plotter):
@@ -116,8 +154,7 @@ def enterStream(widget, tio, plotter):
         popupmsg("Only one stream from each device can be added. Sync streams cannot be added with other streams.")
 
     else:
-        plotter.fig.clf()
-        plotter.reinitialize(500, newSList)
+        plotter.reconfigure(streamList = newSList, queueLength = 500)
         popupmsg("Stream successfully loaded, click 'Go!' to see plot")
           
 
@@ -145,8 +182,7 @@ def addChecked(varLst, plotter, tio):
 
     if len(devList) == len(set(devList)):
         print("newstream", newSList)
-        plotter.fig.clf()
-        plotter.reinitialize(500, newSList)
+        plotter.reconfigure(streamList = newSList, queueLength = 500)
         popupmsg("Stream successfully loaded, click 'Go!' to see plot")
 
     else:
@@ -154,7 +190,7 @@ def addChecked(varLst, plotter, tio):
     
 
 class graphInterface(tkinter.Tk):
-    def __init__(self, tio, plotter, defaultStream, windowLength, *args, **kwargs):
+    def __init__(self, tio, meta, plotter, defaultStream, windowLength, *args, **kwargs):
         tkinter.Tk.__init__(self, *args, **kwargs)
         #tkinter.Tk.iconbitmap(self, default="clienticon.ico")
         tkinter.Tk.wm_title(self, "Twinleaf Monitor")
@@ -183,7 +219,7 @@ class graphInterface(tkinter.Tk):
 
         self.frames = {}
         for F in (StartPage, GraphPage):
-            frame = F(tio, plotter, defaultStream, windowLength, container, self)
+            frame = F(tio, meta, plotter, defaultStream, windowLength, container, self)
             self.frames[F] = frame
             frame.grid(row=0, column=0, sticky="nsew")
         self.show_frame(StartPage)
@@ -194,7 +230,7 @@ class graphInterface(tkinter.Tk):
 
 class StartPage(tkinter.Frame):
 
-    def __init__(self, tio,plotter, defaultStream, windowLength, parent, controller):
+    def __init__(self, tio, meta, plotter, defaultStream, windowLength, parent, controller):
         tkinter.Frame.__init__(self,parent)
         label = tkinter.Label(self, text="Available Streams")
         label.pack()
@@ -202,43 +238,50 @@ class StartPage(tkinter.Frame):
         description = tkinter.Label(self, text = "Load available streams by typing them into the entry box below.  Entered stream values should look like: 'vmr0.vector, vmr1.bar', where different streams are separated by a comma. Only one stream from each device can be added.", bg = 'white', wraplength = 500)
         description.pack()
 
-        def streamChart(tio):
+        def streamChart(meta):
             subframe = tkinter.Frame(self)
             labels = []
             streamb = []
-            deviceAttributes = getStreams(tio)
             i = 0
             n = 0     
             vars = []   
             def setVar(var, value):
                 var.set(value)
-            for key in tio._routes:
-                device = tio._routes[key]
-                labels.append(tkinter.Label(subframe, text = device.dev.name()))
+            for key in meta.routes():
+                labels.append(tkinter.Label(subframe, text = meta.name(key)))
                 labels[i].grid(column = i, row = 1)
                 i+=1
-                #if 'sync' not in device.dev.name().lower():
+                #if 'sync' not in meta.name(key).lower():
                 devVars = []
-                for j in range(len(deviceAttributes[device])):
+                streamLabels = meta.labels(key)
+                for j in range(len(streamLabels)):
                     devVars.append(tkinter.StringVar())
-                    name = device.dev.name().lower().replace(" ", "_")
-                    if key == '/':
-                        stre = name+"." + deviceAttributes[device][j]
-                    else:
-                        stre = name+key+"." + deviceAttributes[device][j]
+                    stre = streamLabels[j]
                     check = tkinter.Label(subframe, text = stre)#Checkbutton(subframe,text = stre, variable = devVars[j], onvalue = stre, offvalue = "NULL", command = lambda: setVar(devVars[j], check.cget("text")))
                     streamb.append(check)
                     devVars[j].set("NULL")
                     streamb[n].grid(column = i-1, row = j+2)
                     n +=1
                 vars.append(devVars)
-            subframe.pack(pady = 20)
+            subframe.pack(pady = 20, after = description)
             # for i in range(len(vars)):
             #     for var in vars[i]:
             #         print("vars", var.get())
-            return vars
-
-        vars = streamChart(tio)
+            return subframe, vars
+
+        # The chart starts from cached metadata; redraw it if the device
+        # turns out to have changed since
+        def refreshChart(chart):
+            if meta.changed.is_set():
+                meta.changed.clear()
+                chart.destroy()
+                chart, vars = streamChart(meta)
+            if not meta.checked.is_set() or meta.changed.is_set():
+                self.after(500, refreshChart, chart)
+
+        if tio is not None:
+            chart, vars = streamChart(meta)
+            refreshChart(chart)
 
         def getStreamEntry():
             subframe2 = tkinter.Frame(self)
@@ -252,7 +295,11 @@ class StartPage(tkinter.Frame):
             b.pack(side = 'left')
             subframe2.pack()
 
-        getStreamEntry()
+        if tio is not None:
+            getStreamEntry()
+        else:
+            replaying = tkinter.Label(self, text = "Replaying " + defaultStream)
+            replaying.pack(pady = 20)
 
         button = tkinter.Button(self, text="Go!",
                             command=lambda: controller.show_frame(GraphPage))
@@ -261,7 +308,7 @@ class StartPage(tkinter.Frame):
         quitbutton.pack()
 
 class GraphPage(tkinter.Frame):
-    def __init__(self, tio, plotter, defaultStream, windowLength, parent, controller):
+    def __init__(self, tio, meta, plotter, defaultStream, windowLength, parent, controller):
         tkinter.Frame.__init__(self,parent)
         
         def graphSettings():
@@ -311,17 +358,36 @@ class GraphPage(tkinter.Frame):
 
 def main():
     # get DeviceSync
-    tio = processCommandLineArgs()
+    tio, meta, args = processCommandLineArgs()
     
     # get defaults for the graph 
-    defaultStream, start_stream , start_length= setDefaults(tio)
+    if args.replay:
+        defaultStream = args.replay
+        start_stream = tlpyplot.ReplayStream(args.replay, speed = args.speed)
+        start_length = 500
+    else:
+        defaultStream, start_stream , start_length= setDefaults(tio, meta)
     # create plot instance
-    plotter = createPlot(start_stream, start_length)
+    metrics = None
+    if args.metrics or args.metrics_log:
+        metrics = tlpyplot.FrameMetrics("plot", overlay = args.metrics, logPath = args.metrics_log)
+    plotter = createPlot(start_stream, start_length, blit = args.blit, metrics = metrics, filters = args.filter, strip = args.strip)
+    if args.record:
+        plotter.startRecording(args.record)
     
-    app = graphInterface(tio, plotter, defaultStream, start_length)
+    app = graphInterface(tio, meta, plotter, defaultStream, start_length)
     app.geometry("1280x720")
-    ani = matplotlib.animation.FuncAnimation(plotter.fig, plotter.animate, interval=100)#dev.data.rate())
-    app.mainloop()
+    scheduler = tlpyplot.FrameScheduler(app.after)
+    scheduler.addPlotter(plotter, interval = 0.1)
+    scheduler.start()
+    if args.metrics or args.metrics_log:
+        tlpyplot.startup.markFirstDraw(plotter.fig, onDone = lambda timer: timer.report(show = args.metrics, logPath = args.metrics_log))
+    try:
+        app.mainloop()
+    finally:
+        plotter.stopRecording()
+        if metrics is not None:
+            metrics.close()
 
 if __name__ == "__main__":
     main()
@@ -6,7 +6,6 @@ Author: Esme Rubinstein <rubinstein@twinleaf.com>, Tom Kornack <kornack@twinleaf
 """
 
 import matplotlib
-import time
 import argparse
 import tkinter
 import tlpyplot
@@ -23,14 +22,13 @@ def changeQSize(widget, plotter, tio):
     plotter.changeQueueSize(windowLength)
 
 def rateChange(widget, plotter, tio):
+    if tio is None:
+        popupmsg("The data rate of a replayed capture cannot be changed.")
+        return
     rate = widget.get()
     rate = float(rate)
     tio._routes['/'].data.rate(rate)
-    plotter.fig.clf()
-    plotter.reinitialize(plotter.queueLength, plotter.streamList)
-    plotter.allax[0].set_ylabel("Field X (nT)")
-    plotter.allax[1].set_ylabel("Field Y (nT)")
-    plotter.allax[2].set_ylabel("Field Z (nT)")
+    plotter.reconfigure(rate = rate)
 
 def upDownEntry(widget, direction, plotter, tio, func):
     current = float(widget.get())
@@ -48,11 +46,60 @@ def processCommandLineArgs():
     parser.add_argument("url", 
                 nargs='?', 
                 default='tcp://localhost/',
-                help='URL: tcp://localhost')
+                help='URL: tcp://localhost, or sim://vmr, sim://sync, sim://cb for a simulated device')
+    parser.add_argument("--record",
+                metavar='FILE',
+                help='Record every sample to a binary capture file')
+    parser.add_argument("--replay",
+                metavar='FILE',
+                help='Play back a capture file instead of connecting to a device')
+    parser.add_argument("--speed",
+                type=float,
+                default=1.0,
+                help='Replay speed as a multiple of real time (0: as fast as possible)')
+    parser.add_argument("--blit",
+                action='store_true',
+                help='Only redraw the data lines between axis rescales')
+    parser.add_argument("--welch",
+                type=float,
+                metavar='SECONDS',
+                help='Average the noise spectrum over Welch segments of this length')
+    parser.add_argument("--forget",
+                type=float,
+                help='Weight kept by the Welch average per new segment (default: average everything)')
+    parser.add_argument("--waterfall",
+                type=float,
+                default=600,
+                metavar='SECONDS',
+                help='History shown by the spectrogram beside the noise spectrum (0: no spectrogram)')
+    parser.add_argument("--waterfall-segment",
+                type=float,
+                default=1.0,
+                metavar='SECONDS',
+                help='Segment length of the spectrogram, setting its frequency resolution')
+    parser.add_argument("--filter",
+                metavar='SPEC',
+                help="Filter and decimate the data before anything else sees it, e.g. 'notch:60,lowpass:100,decimate:10'")
+    parser.add_argument("--metrics",
+                action='store_true',
+                help='Show frame rate, ingest and draw times on the plots')
+    parser.add_argument("--metrics-log",
+                metavar='FILE',
+                help='Append periodic performance summaries to this JSON lines file')
+    # The console script dispatches --headless before this module, and with
+    # it Tk, is imported; see tlpyplottools.launch
+    parser.add_argument("--headless",
+                action='store_true',
+                help='Run without a GUI and print periodic noise and statistics summaries (see --headless --help)')
     args = parser.parse_args()
-    tio = tlpyplot.tldevicesync.DeviceSync(args.url)
-    time.sleep(1)
-    return tio
+    if args.headless:
+        parser.error("--headless runs through the vm_monitor console script or python -m tlpyplottools.launch vm_monitor")
+    tlpyplot.startup.mark("imports")
+    if args.replay:
+        return None, args
+    tio = tlpyplot.openDevice(args.url)
+    tlpyplot.startup.mark("device ready")
+    return tio, args
 
 def popupmsg(msg):
     popup = tkinter.Tk()
@@ -67,7 +114,8 @@ def saveData(plotter):
     f = tkinter.filedialog.asksaveasfile(mode = 'w', defaultextension = ".txt")
     if f is None:
         return
-    a = np.asarray(plotter.alldata)
+    with plotter.lock:
+        a = np.array(plotter.alldata)
     np.savetxt(f, a.T, delimiter=",")
     f.close()
     
@@ -76,8 +124,8 @@ def setDefaults(tio):
     start_stream = [tio.vmr.vector]
     return start_stream, start_length
 
-def createPlot(streamList, windowLength):
-    plotter = tlpyplot.TLPyPlot(queueLength = windowLength, streamList = streamList)
+def createPlot(streamList, windowLength, blit = False, metrics = None, filters = None):
+    plotter = tlpyplot.TLPyPlot(queueLength = windowLength, streamList = streamList, threaded = True, blit = blit, metrics = metrics, filters = filters)
     return plotter
 
 class graphInterface(tkinter.Tk):
@@ -197,20 +245,46 @@ class GraphPage(tkinter.Frame):
 
 def main():
     # get DeviceSync
-    tio = processCommandLineArgs()
+    tio, args = processCommandLineArgs()
     
     # get defaults for the graph 
-    start_stream , start_length = setDefaults(tio)
+    if args.replay:
+        start_stream = tlpyplot.ReplayStream(args.replay, speed = args.speed)
+        start_length = 500
+    else:
+        start_stream , start_length = setDefaults(tio)
     
     # create plot instance
-    plotter = createPlot(start_stream, start_length)
-    noiseplotter = tlpyplot.vm_noiseplot.vmNoise([tio.vmr.vector], plotter)
+    metrics = None
+    if args.metrics or args.metrics_log:
+        metrics = tlpyplot.FrameMetrics("plot", overlay = args.metrics, logPath = args.metrics_log)
+    plotter = createPlot(start_stream, start_length, blit = args.blit, metrics = metrics, filters = args.filter)
+    if args.record:
+        plotter.startRecording(args.record)
+    noiseMetrics = None
+    if metrics is not None:
+        noiseMetrics = tlpyplot.FrameMetrics("noise", interval = 2.0, overlay = args.metrics, logPath = args.metrics_log, ingestLabel = "compute")
+    noiseplotter = tlpyplot.vm_noiseplot.vmNoise(start_stream, plotter, welchSegment = args.welch, forget = args.forget, processes = True, metrics = noiseMetrics,
+                                              waterfall = args.waterfall, waterfallSegment = args.waterfall_segment)
     
     app = graphInterface(tio, plotter, start_length, noiseplotter)
     app.geometry("1290x800")
-    aniv = matplotlib.animation.FuncAnimation(plotter.fig, plotter.animate, interval = 100)
-    anin = matplotlib.animation.FuncAnimation(noiseplotter.fig, noiseplotter.runInThread, interval = 2000)
-    app.mainloop()
+    scheduler = tlpyplot.FrameScheduler(app.after)
+    scheduler.addPlotter(plotter, interval = 0.1)
+    # Matplotlib is only touched from the Tk thread; the spectra themselves are
+    # streamed or computed by the worker processes, so a refresh stays short
+    scheduler.add(noiseplotter.fig, noiseplotter.run, interval = 2.0, counter = lambda: plotter.samplesIngested)
+    scheduler.start()
+    if args.metrics or args.metrics_log:
+        tlpyplot.startup.markFirstDraw(plotter.fig, onDone = lambda timer: timer.report(show = args.metrics, logPath = args.metrics_log))
+    try:
+        app.mainloop()
+    finally:
+        noiseplotter.close()
+        plotter.stopRecording()
+        if metrics is not None:
+            metrics.close()
+            noiseMetrics.close()
 
 if __name__ == "__main__":
     main()